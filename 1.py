@@ -1,47 +1,56 @@
 import os
 
 import requests
-from PIL import Image
-from io import BytesIO
+from dotenv import load_dotenv
+from clustering import cluster_markers
+from mercator import fit_viewport, format_ll
+from polyline import MAX_URL_LENGTH
+from static_maps import request_url, save_map
 
 
-def get_map_image(api_key, stadiums_location):
-    # Base URL for Yandex Static Maps API
-    base_url = "https://static-maps.yandex.ru/1.x/"
-
-    # Create points string for all stadiums
-    # Reverse coordinates order for Yandex Maps API (lon,lat to lat,lon)
+def get_map_image(api_key, stadiums_location, zoom=None, size=(650, 450)):
+    # Collect coordinates of all stadiums, given as "lon,lat" strings
     points = []
     for name, coords in stadiums_location.items():
-        lat, lon = coords.split(',')
-        points.append(f"{lat},{lon},pm2rdm")
+        lon, lat = map(float, coords.split(','))
+        points.append((lon, lat))
+
+    if not points:
+        print("No stadiums to show")
+        return False
+
+    # Centre and zoom so that every stadium is in the frame
+    center, fitted_zoom = fit_viewport(points, size)
+    zoom = fitted_zoom if zoom is None else zoom
 
     # Parameters for the API request
     params = {
         "apikey": api_key,
         "l": "map",  # Layer type (map)
-        "pt": "~".join(points),  # Points with markers
-        "z": 11,  # Zoom level
-        "size": "650,450",  # Image size
+        "ll": format_ll(center),  # Map centre
+        "z": zoom,  # Zoom level
+        "size": f"{size[0]},{size[1]}",  # Image size
         "lang": "ru_RU"  # Language setting for Russian labels
     }
 
-    try:
-        # Make the request
-        response = requests.get(base_url, params=params)
+    # Points with markers, nearby ones merged into counted clusters so
+    # the request stays within the marker and URL limits
+    budget = MAX_URL_LENGTH - len(request_url({**params, "pt": ""}))
+    params["pt"] = cluster_markers(points, zoom, budget)
 
+    try:
         # Print the URL for debugging (remove in production)
-        print("Request URL:", response.url)
-
-        if response.status_code == 200:
-            image = Image.open(BytesIO(response.content))
-            image.save("moscow_stadiums.png")
-            print("Map saved as moscow_stadiums.png")
-            return True
-        else:
-            print(f"Error: {response.status_code}")
-            print("Response content:", response.text)
-            return False
+        print("Request URL:", request_url(params))
+
+        # Make the request (or reuse a cached image) and save it as is
+        save_map(params, "moscow_stadiums.png")
+        print("Map saved as moscow_stadiums.png")
+        return True
+
+    except requests.HTTPError as e:
+        print(f"Error: {e.response.status_code}")
+        print("Response content:", e.response.text)
+        return False
 
     except requests.exceptions.RequestException as e:
         print(f"Request failed: {e}")
@@ -49,6 +58,8 @@ def get_map_image(api_key, stadiums_location):
 
 
 def main():
+    load_dotenv()
+
     api_key = os.getenv('API_KEY')
 
     # Stadium coordinates (latitude,longitude format)
@@ -1,33 +1,20 @@
 import requests
-from PIL import Image
-from io import BytesIO
-import math
+from static_maps import request_url, save_map
 import os
 from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-
-def lonlat_distance(a, b):
-    degree_to_meters_factor = 111 * 1000  # 111 kilometers in meters
-    a_lon, a_lat = a
-    b_lon, b_lat = b
-
-    radians_lattitude = math.radians((a_lat + b_lat) / 2.)
-    lat_lon_factor = math.cos(radians_lattitude)
-
-    dx = abs(a_lon - b_lon) * degree_to_meters_factor * lat_lon_factor
-    dy = abs(a_lat - b_lat) * degree_to_meters_factor
-
-    return math.sqrt(dx * dx + dy * dy)
+from geo import distances_to, path_length
+from tracks import track_length
+from mercator import fit_viewport, format_ll
+from polyline import MAX_URL_LENGTH, build_polylines
 
 
 def calculate_path_length(coordinates):
-    total_distance = 0
-    for i in range(len(coordinates) - 1):
-        total_distance += lonlat_distance(coordinates[i], coordinates[i + 1])
-    return total_distance
+    # A GPX, CSV or binary track file is read in chunks instead of as a list
+    if isinstance(coordinates, (str, os.PathLike)):
+        return track_length(os.fspath(coordinates))
+    if len(coordinates) < 2:
+        return 0
+    return path_length(coordinates)
 
 
 def get_middle_point(coordinates):
@@ -38,43 +25,53 @@ def get_middle_point(coordinates):
     return coordinates[middle_idx]
 
 
-def visualize_path(api_key, coordinates):
-    base_url = "https://static-maps.yandex.ru/1.x/"
-
-    # Create path string in the correct format for Yandex API
-    path_points = []
-    for lon, lat in coordinates:
-        path_points.append(f"{lon:.6f},{lat:.6f}")  # Yandex polyline expects lon,lat
-
+def visualize_path(api_key, coordinates, zoom=None, size=(650, 450)):
     # Get middle point for marker
     middle_point = get_middle_point(coordinates)
     middle_point_str = f"{middle_point[0]},{middle_point[1]}"  # lon,lat
+
+    # Centre and zoom so the whole path is in the frame; every part of a
+    # split path uses the same view so the images line up
+    center, fitted_zoom = fit_viewport(coordinates, size)
+    zoom = fitted_zoom if zoom is None else zoom
+
     # f"c:blue,w:3," +
     params = {
         "apikey": api_key,
         "l": "map",
-        "pl": ",".join(path_points),  # Path line
-        "pt": f"{middle_point_str},pm2rdm",  # Middle point marker
-        "z": 13,
-        "size": "650,450",
+        "ll": format_ll(center),
+        "z": zoom,
+        "size": f"{size[0]},{size[1]}",
         "lang": "ru_RU"
     }
+    marker = f"{middle_point_str},pm2rdm"  # Middle point marker
 
-    try:
-        response = requests.get(base_url, params=params)
+    # Drop points invisible at this zoom and split the path (Yandex polyline
+    # expects lon,lat) into as few requests as the URL length allows
+    budget = MAX_URL_LENGTH - len(request_url({**params, "pt": marker, "pl": ""}))
+    parts = build_polylines(coordinates, zoom, budget)
 
-        # Print URL for debugging (remove in production)
-        print("Request URL:", response.url)
+    # With several parts the marker goes on the part passing closest to it
+    marker_part = min(range(len(parts)), key=lambda i: distances_to(middle_point, parts[i][1]).min())
 
-        if response.status_code == 200:
-            image = Image.open(BytesIO(response.content))
-            image.save("path_visualization.png")
-            print("Map saved as path_visualization.png")
-            return True
-        else:
-            print(f"Error: {response.status_code}")
-            print("Response content:", response.text)
-            return False
+    try:
+        for i, (path_line, _) in enumerate(parts):
+            part_params = {**params, "pl": path_line}  # Path line
+            if i == marker_part:
+                part_params["pt"] = marker
+            filename = "path_visualization.png" if i == 0 else f"path_visualization_{i + 1}.png"
+
+            # Print URL for debugging (remove in production)
+            print("Request URL:", request_url(part_params))
+
+            save_map(part_params, filename)
+            print("Map saved as", filename)
+        return True
+
+    except requests.HTTPError as e:
+        print(f"Error: {e.response.status_code}")
+        print("Response content:", e.response.text)
+        return False
 
     except requests.exceptions.RequestException as e:
         print(f"Request failed: {e}")
@@ -82,6 +79,8 @@ def visualize_path(api_key, coordinates):
 
 
 def main():
+    load_dotenv()
+
     # Get API key from environment variable
     api_key = os.getenv('API_KEY')
 
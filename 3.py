@@ -1,12 +1,8 @@
 import requests
-from PIL import Image
-from io import BytesIO
+from static_maps import save_map
 import os
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
 
 def get_satellite_image(api_key, longitude, latitude, zoom=16):
     """
@@ -21,8 +17,6 @@ def get_satellite_image(api_key, longitude, latitude, zoom=16):
     Returns:
         bool: True if successful, False otherwise
     """
-    base_url = "https://static-maps.yandex.ru/1.x/"
-
     params = {
         "apikey": api_key,
         "l": "map",  # Layer type should be 'sat' for satellite but api doesn't allow?
@@ -33,19 +27,49 @@ def get_satellite_image(api_key, longitude, latitude, zoom=16):
     }
 
     try:
-        response = requests.get(base_url, params=params)
-
-        if response.status_code == 200:
-            # Save the image
-            image = Image.open(BytesIO(response.content))
-            filename = f"satellite_image_{longitude}_{latitude}.png"
-            image.save(filename)
-            print(f"Satellite image saved as {filename}")
-            return True
-        else:
-            print(f"Error: {response.status_code}")
-            print("Response content:", response.text)
-            return False
+        # Save the image
+        filename = f"satellite_image_{longitude}_{latitude}.png"
+        save_map(params, filename)
+        print(f"Satellite image saved as {filename}")
+        return True
+
+    except requests.HTTPError as e:
+        print(f"Error: {e.response.status_code}")
+        print("Response content:", e.response.text)
+        return False
+
+    except requests.exceptions.RequestException as e:
+        print(f"Request failed: {e}")
+        return False
+
+
+def get_satellite_mosaic(api_key, bbox, zoom=16, filename=None):
+    """
+    Download an area larger than one frame as a single stitched image
+
+    Args:
+        api_key (str): Yandex Maps API key
+        bbox (tuple): (min_lon, min_lat, max_lon, max_lat)
+        zoom (int): Zoom level (1-17)
+        filename (str): Output PNG file
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    # numpy is only needed for mosaics, so single images don't load it
+    from mosaic import build_mosaic
+
+    filename = filename or "satellite_mosaic_{}_{}_{}_{}.png".format(*bbox)
+
+    try:
+        width, height = build_mosaic(api_key, bbox, zoom, filename)
+        print(f"Satellite mosaic {width}x{height} saved as {filename}")
+        return True
+
+    except requests.HTTPError as e:
+        print(f"Error: {e.response.status_code}")
+        print("Response content:", e.response.text)
+        return False
 
     except requests.exceptions.RequestException as e:
         print(f"Request failed: {e}")
@@ -53,6 +77,8 @@ def get_satellite_image(api_key, longitude, latitude, zoom=16):
 
 
 def main():
+    load_dotenv()
+
     api_key = os.getenv('API_KEY')
 
     if not api_key:
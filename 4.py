@@ -1,10 +1,9 @@
 import requests
+from batch_geocode import geocode_all
+from geocoder import geocode
 import os
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
 
 def get_city_coordinates(api_key, city_name):
     """
@@ -17,37 +16,21 @@ def get_city_coordinates(api_key, city_name):
     Returns:
         tuple: (latitude, longitude) or None if not found
     """
-    base_url = "https://geocode-maps.yandex.ru/1.x/"
-
-    params = {
-        "apikey": api_key,
-        "geocode": city_name,
-        "format": "json",
-        "results": 1
-    }
-
     try:
-        response = requests.get(base_url, params=params)
-
-        if response.status_code == 200:
-            data = response.json()
-
-            # Get the first result's coordinates
-            features = data["response"]["GeoObjectCollection"]["featureMember"]
-
-            if features:
-                # Get coordinates (they come as "longitude latitude")
-                coords_str = features[0]["GeoObject"]["Point"]["pos"]
-                lon, lat = map(float, coords_str.split())
-                return lat, lon  # Return as (latitude, longitude)
-            else:
-                print(f"City not found: {city_name}")
-                return None
+        result = geocode(api_key, city_name, results=1)
 
+        if result:
+            # Get coordinates (they come as "longitude latitude")
+            lon, lat = map(float, result["pos"].split())
+            return lat, lon  # Return as (latitude, longitude)
         else:
-            print(f"Error for {city_name}: {response.status_code}")
+            print(f"City not found: {city_name}")
             return None
 
+    except requests.HTTPError as e:
+        print(f"Error for {city_name}: {e.response.status_code}")
+        return None
+
     except Exception as e:
         print(f"Error processing {city_name}: {e}")
         return None
@@ -63,14 +46,21 @@ def find_southernmost_city(cities_data):
     Returns:
         str: Name of the southernmost city
     """
-    if not cities_data:
+    # Imported here: the store needs numpy, which isn't worth loading
+    # before the cities have even been entered
+    from geo_store import GeoStore
+
+    # Points are sorted by latitude once, the southernmost one comes first
+    store = GeoStore.from_records((city, coords[1], coords[0]) for city, coords in cities_data if coords)
+    if not len(store):
         return None
 
-    # Find city with minimum latitude
-    return min(cities_data, key=lambda x: x[1][0] if x[1] else float('inf'))[0]
+    return store.name(store.southernmost())
 
 
 def main():
+    load_dotenv()
+
     api_key = os.getenv('GEOCODE_API_KEY')
 
     if not api_key:
@@ -88,10 +78,11 @@ def main():
         print("No valid cities entered")
         return
 
-    # Get coordinates for each city
+    # Get coordinates for all cities concurrently, keeping input order
+    all_coords = geocode_all(lambda city: get_city_coordinates(api_key, city), cities)
+
     cities_with_coords = []
-    for city in cities:
-        coords = get_city_coordinates(api_key, city)
+    for city, coords in zip(cities, all_coords):
         if coords:
             cities_with_coords.append((city, coords))
             print(f"Found coordinates for {city}: {coords}")
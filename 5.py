@@ -1,128 +1,100 @@
 import requests
+import http_client
+from geocoder import geocode
 import os
 from dotenv import load_dotenv
-from math import radians, cos, sqrt
+from geo import distances_to
+from mercator import fit_viewport, format_ll
+from memory_cache import MemoryCache
+from metrics import span
 
-# Load environment variables
-load_dotenv()
-
-
-def lonlat_distance(a, b):
-    """Calculate distance between two points in meters"""
-    degree_to_meters_factor = 111 * 1000
-    a_lon, a_lat = a
-    b_lon, b_lat = b
-
-    radians_lattitude = radians((a_lat + b_lat) / 2.)
-    lat_lon_factor = cos(radians_lattitude)
-
-    dx = abs(a_lon - b_lon) * degree_to_meters_factor * lat_lon_factor
-    dy = abs(a_lat - b_lat) * degree_to_meters_factor
-
-    return sqrt(dx * dx + dy * dy)
+# Search results for recently seen locations
+search_cache = MemoryCache(max_entries=1000, ttl=600, negative_ttl=60, name="search")
 
 
 def get_coordinates(api_key, address):
     """Get coordinates for an address using Yandex Geocoder"""
-    base_url = "https://geocode-maps.yandex.ru/1.x/"
-
-    params = {
-        "apikey": api_key,
-        "geocode": address,
-        "format": "json"
-    }
-
     try:
-        response = requests.get(base_url, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            features = data["response"]["GeoObjectCollection"]["featureMember"]
-
-            if features:
-                coords_str = features[0]["GeoObject"]["Point"]["pos"]
-                lon, lat = map(float, coords_str.split())
-                return lon, lat
-            else:
-                print("Address not found")
-                return None
+        result = geocode(api_key, address)
 
+        if result:
+            lon, lat = map(float, result["pos"].split())
+            return lon, lat
         else:
-            print(f"Geocoding error: {response.status_code}")
+            print("Address not found")
             return None
 
+    except requests.HTTPError as e:
+        print(f"Geocoding error: {e.response.status_code}")
+        return None
+
     except Exception as e:
         print(f"Error getting coordinates: {e}")
         return None
 
 
-def find_nearest_pharmacy(api_key, coords):
-    """Find nearest pharmacy using Yandex Organization Search"""
+def search_pharmacies(api_key, coords):
+    """Search pharmacies around the coordinates, returning the found features"""
     search_url = "https://search-maps.yandex.ru/v1/"
 
     params = {
         "apikey": api_key,
         "text": "аптека",
-        "ll": f"{coords[0]},{coords[1]}",
+        "ll": f"{coords[0]:.6f},{coords[1]:.6f}",
         "type": "biz",
         "lang": "ru_RU",
         "results": 10,
         "spn": "0.02,0.02"
     }
 
-    try:
-        response = requests.get(search_url, params=params)
+    @span("org_search")
+    def load():
+        response = http_client.get(search_url, params=params)
+        response.raise_for_status()
+        return response.json().get("features", [])
 
-        if response.status_code == 200:
-            data = response.json()
+    return search_cache.get_or_load(params["ll"], load)
 
-            if not data.get("features"):
-                print("No pharmacies found nearby")
-                return None
 
-            # Find nearest pharmacy
-            nearest = None
-            min_distance = float('inf')
+def nearest_pharmacy(features, coords):
+    """Pick the pharmacy nearest to the coordinates from search results, or None if there are none"""
+    if not features:
+        return None
 
-            for feature in data["features"]:
-                pharmacy_coords = feature["geometry"]["coordinates"]
-                distance = lonlat_distance(coords, pharmacy_coords)
+    pharmacy_coords = [feature["geometry"]["coordinates"] for feature in features]
+    distances = distances_to(coords, pharmacy_coords)
+    nearest_idx = int(distances.argmin())
 
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest = {
-                        "name": feature["properties"]["CompanyMetaData"].get("name", "Неизвестная аптека"),
-                        "address": feature["properties"]["CompanyMetaData"].get("address", "Адрес не указан"),
-                        "distance": distance,
-                        "coordinates": pharmacy_coords
-                    }
+    company = features[nearest_idx]["properties"]["CompanyMetaData"]
+    return {
+        "name": company.get("name", "Неизвестная аптека"),
+        "address": company.get("address", "Адрес не указан"),
+        "distance": float(distances[nearest_idx]),
+        "coordinates": pharmacy_coords[nearest_idx]
+    }
 
-            return nearest
 
-        else:
-            print(f"Search error: {response.status_code}")
-            return None
+def find_nearest_pharmacy(api_key, coords):
+    """Find nearest pharmacy using Yandex Organization Search"""
+    try:
+        nearest = nearest_pharmacy(search_pharmacies(api_key, coords), coords)
+
+        if nearest is None:
+            print("No pharmacies found nearby")
+        return nearest
+
+    except requests.HTTPError as e:
+        print(f"Search error: {e.response.status_code}")
+        return None
 
     except Exception as e:
         print(f"Error finding pharmacy: {e}")
         return None
 
 
-def main():
-    # Get API keys from environment variables
-    geocoder_api_key = os.getenv('GEOCODE_API_KEY')
-    search_api_key = os.getenv('SEARCH_API_KEY')  # You'll need a separate key for organization search
-
-    if not geocoder_api_key or not search_api_key:
-        print("Error: API keys not found in environment variables")
-        return
-
-    # Get address from user
-    address = input("Введите ваш адрес: ").strip()
-
-    if not address:
-        print("Адрес не введен")
-        return
-
+@span("find_pharmacy")
+def show_nearest_pharmacy(geocoder_api_key, search_api_key, address):
+    """Geocode the address, find the nearest pharmacy and print it with a map link"""
     # Get coordinates for the address
     coords = get_coordinates(geocoder_api_key, address)
 
@@ -141,12 +113,14 @@ def main():
         print(f"Расстояние: {nearest['distance']:.0f} метров")
 
         # Optionally: Generate a static map showing both points
+        # Centre and zoom so both points are in the frame
+        center, zoom = fit_viewport([coords, nearest['coordinates']], max_zoom=16)
         map_url = (
             "https://static-maps.yandex.ru/1.x/"
             f"?apikey={geocoder_api_key}"
-            f"&ll={coords[0]},{coords[1]}"
+            f"&ll={format_ll(center)}"
             "&l=map"
-            "&z=15"
+            f"&z={zoom}"
             f"&pt={coords[0]},{coords[1]},pm2rdm~"
             f"{nearest['coordinates'][0]},{nearest['coordinates'][1]},pm2gnm"
         )
@@ -155,5 +129,26 @@ def main():
         print(map_url)
 
 
+def main():
+    load_dotenv()
+
+    # Get API keys from environment variables
+    geocoder_api_key = os.getenv('GEOCODE_API_KEY')
+    search_api_key = os.getenv('SEARCH_API_KEY')  # You'll need a separate key for organization search
+
+    if not geocoder_api_key or not search_api_key:
+        print("Error: API keys not found in environment variables")
+        return
+
+    # Get address from user
+    address = input("Введите ваш адрес: ").strip()
+
+    if not address:
+        print("Адрес не введен")
+        return
+
+    show_nearest_pharmacy(geocoder_api_key, search_api_key, address)
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
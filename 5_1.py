@@ -1,65 +1,52 @@
 import requests
+import http_client
+from geocoder import geocode
 import os
 from dotenv import load_dotenv
-from math import radians, cos, sqrt
+from overpass import DEFAULT_CHUNK_SIZE, OVERPASS_URL, iter_elements, nearest_elements
+from mercator import fit_viewport, format_ll
+from metrics import span
+from poi_index import POIIndex
 import time
 
 
-def lonlat_distance(a, b):
-    """Calculate distance between two points in meters"""
-    degree_to_meters_factor = 111 * 1000
-    a_lon, a_lat = a
-    b_lon, b_lat = b
-
-    radians_lattitude = radians((a_lat + b_lat) / 2.)
-    lat_lon_factor = cos(radians_lattitude)
-
-    dx = abs(a_lon - b_lon) * degree_to_meters_factor * lat_lon_factor
-    dy = abs(a_lat - b_lat) * degree_to_meters_factor
-
-    return sqrt(dx * dx + dy * dy)
-
-
 def get_coordinates(api_key, address):
     """Get coordinates using Yandex Geocoder"""
-    base_url = "https://geocode-maps.yandex.ru/1.x/"
-
-    params = {
-        "apikey": api_key,
-        "geocode": address,
-        "format": "json"
-    }
-
     try:
-        response = requests.get(base_url, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            features = data["response"]["GeoObjectCollection"]["featureMember"]
-
-            if features:
-                coords_str = features[0]["GeoObject"]["Point"]["pos"]
-                lon, lat = map(float, coords_str.split())
-                return lon, lat
-            else:
-                print("Address not found")
-                return None
+        result = geocode(api_key, address)
 
+        if result:
+            lon, lat = map(float, result["pos"].split())
+            return lon, lat
         else:
-            print(f"Geocoding error: {response.status_code}")
+            print("Address not found")
             return None
 
+    except requests.HTTPError as e:
+        print(f"Geocoding error: {e.response.status_code}")
+        return None
+
     except Exception as e:
         print(f"Error getting coordinates: {e}")
         return None
 
 
-def find_nearest_pharmacy_osm(coords):
-    """Find nearest pharmacy using OpenStreetMap Overpass API"""
-    # Using Overpass API
-    overpass_url = "https://overpass-api.de/api/interpreter"
+@span("overpass")
+def query_nearest_pharmacy_osm(coords, radius=2000):
+    """
+    Ask the Overpass API for the pharmacy nearest to the coordinates
 
-    # Search for pharmacies within 2km radius
-    radius = 2000  # meters
+    Args:
+        coords (tuple): (longitude, latitude)
+        radius (int): Search radius in meters
+
+    Returns:
+        dict: name, distance and coordinates, or None if there is no pharmacy within the radius
+
+    Raises:
+        requests.HTTPError: If Overpass answers with an error status
+        requests.RequestException: If the request fails
+    """
     query = f"""
     [out:json][timeout:25];
     (
@@ -72,44 +59,68 @@ def find_nearest_pharmacy_osm(coords):
     out skel qt;
     """
 
-    try:
-        response = requests.post(overpass_url, data={"data": query})
+    # Stream the reply so only the nearest node is kept in memory
+    with http_client.post(OVERPASS_URL, data={"data": query}, stream=True) as response:
+        response.raise_for_status()
 
-        if response.status_code == 200:
-            data = response.json()
+        # Process only nodes for simplicity
+        elements = iter_elements(response.iter_content(DEFAULT_CHUNK_SIZE))
+        found = nearest_elements(elements, coords, k=1, element_type="node")
 
-            if not data.get("elements"):
-                print("No pharmacies found nearby")
-                return None
+    if not found:
+        return None
 
-            # Find nearest pharmacy
-            nearest = None
-            min_distance = float('inf')
+    distance, node = found[0]
+    return {
+        "name": node.get("tags", {}).get("name", "Неизвестная аптека"),
+        "distance": distance,
+        "coordinates": (node["lon"], node["lat"])
+    }
 
-            for element in data["elements"]:
-                if element["type"] == "node":  # Process only nodes for simplicity
-                    pharmacy_coords = (element.get("lon"), element.get("lat"))
-                    distance = lonlat_distance(coords, pharmacy_coords)
 
-                    if distance < min_distance:
-                        min_distance = distance
-                        nearest = {
-                            "name": element.get("tags", {}).get("name", "Неизвестная аптека"),
-                            "distance": distance,
-                            "coordinates": pharmacy_coords
-                        }
+def find_nearest_pharmacy_osm(coords):
+    """Find nearest pharmacy using OpenStreetMap Overpass API"""
+    try:
+        # Search for pharmacies within 2km radius
+        nearest = query_nearest_pharmacy_osm(coords, radius=2000)
 
-            return nearest
+        if nearest is None:
+            print("No pharmacies found nearby")
+        return nearest
 
-        else:
-            print(f"Search error: {response.status_code}")
-            return None
+    except requests.HTTPError as e:
+        print(f"Search error: {e.response.status_code}")
+        return None
 
     except Exception as e:
         print(f"Error finding pharmacy: {e}")
         return None
 
 
+def nearest_in_index(index, coords, radius=2000):
+    """Nearest pharmacy in an open POIIndex, or None if there is none within the radius"""
+    found = index.nearest(coords[0], coords[1], k=1, max_radius=radius)
+    if not found:
+        return None
+
+    nearest_idx, distance = found[0]
+    lon, lat = index.coords[nearest_idx]
+    return {
+        "name": index.name(nearest_idx) or "Неизвестная аптека",
+        "distance": distance,
+        "coordinates": (float(lon), float(lat))
+    }
+
+
+def find_nearest_pharmacy_offline(index_path, coords, radius=2000):
+    """Find nearest pharmacy in a prebuilt POI index (see poi_index.py) without network"""
+    nearest = nearest_in_index(POIIndex(index_path), coords, radius)
+
+    if nearest is None:
+        print("No pharmacies found nearby")
+    return nearest
+
+
 def main():
     load_dotenv()
     api_key = os.getenv('GEOCODE_API_KEY')
@@ -133,9 +144,13 @@ def main():
 
     print(f"Координаты адреса: {coords}")
 
-    # Find nearest pharmacy using OpenStreetMap
+    # Find nearest pharmacy using OpenStreetMap, offline if an index was built
     print("Поиск ближайших аптек...")
-    nearest = find_nearest_pharmacy_osm(coords)
+    index_path = os.getenv('PHARMACY_INDEX')
+    if index_path:
+        nearest = find_nearest_pharmacy_offline(index_path, coords)
+    else:
+        nearest = find_nearest_pharmacy_osm(coords)
 
     if nearest:
         print("\nБлижайшая аптека:")
@@ -143,12 +158,14 @@ def main():
         print(f"Расстояние: {nearest['distance']:.0f} метров")
 
         # Generate a static map URL using Yandex Static Maps API
+        # Centre and zoom so both points are in the frame
+        center, zoom = fit_viewport([coords, nearest['coordinates']], max_zoom=16)
         map_url = (
             "https://static-maps.yandex.ru/1.x/"
             f"?apikey={api_key}"
-            f"&ll={coords[0]},{coords[1]}"
+            f"&ll={format_ll(center)}"
             "&l=map"
-            "&z=15"
+            f"&z={zoom}"
             f"&pt={coords[0]},{coords[1]},pm2rdm~"
             f"{nearest['coordinates'][0]},{nearest['coordinates'][1]},pm2gnm"
         )
@@ -1,17 +1,23 @@
 import requests
-from PIL import Image
-from io import BytesIO
+from static_maps import save_map
 import os
 from dotenv import load_dotenv
 import random
-
-# Load environment variables
-load_dotenv()
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 
 class CityGuessingGame:
-    def __init__(self):
+    def __init__(self, prefetch_rounds=3, prefetch_workers=2):
         self.api_key = os.getenv('API_KEY')
+        # Сколько раундов готовится заранее, пока игрок думает
+        self.prefetch_rounds = prefetch_rounds
+        self.prefetch_workers = prefetch_workers
+        self._executor = None
+        self._queued_rounds = deque()
+        self._reserved_paths = set()
+        self._paths_lock = threading.Lock()
         # Список городов России
         self.cities = [
             {"name": "Москва", "coords": "37.6173,55.7558"},
@@ -39,48 +45,112 @@ class CityGuessingGame:
         return 'map'
         # return random.choice(['map', 'sat'])
 
-    def get_city_image(self, city, save_path):
-        """Получить изображение города"""
-        base_url = "https://static-maps.yandex.ru/1.x/"
+    def get_random_offset(self):
+        """Случайное смещение для того, чтобы показать разные части города"""
+        delta = 0.02  # примерно 2км
+        return random.uniform(-delta, delta), random.uniform(-delta, delta)
 
+    def get_city_image(self, city, save_path, zoom=None, offset=None):
+        """Получить изображение города"""
         # Получаем координаты
         lon, lat = map(float, city["coords"].split(','))
 
-        # Случайное смещение для того, чтобы показать разные части города
-        delta = 0.02  # примерно 2км
-        lon_offset = random.uniform(-delta, delta)
-        lat_offset = random.uniform(-delta, delta)
+        lon_offset, lat_offset = offset or self.get_random_offset()
 
         params = {
             "apikey": self.api_key,
             "l": self.get_random_map_type(),
             "ll": f"{lon + lon_offset},{lat + lat_offset}",
-            "z": self.get_random_zoom(),
+            "z": zoom or self.get_random_zoom(),
             "size": "650,450",
             "lang": "ru_RU"
         }
 
         try:
-            response = requests.get(base_url, params=params)
+            save_map(params, save_path)
+            return True
 
-            if response.status_code == 200:
-                image = Image.open(BytesIO(response.content))
-                image.save(save_path)
-                return True
-            else:
-                print(f"Error: {response.status_code}")
-                return False
+        except requests.HTTPError as e:
+            print(f"Error: {e.response.status_code}")
+            return False
 
         except Exception as e:
             print(f"Error getting image: {e}")
             return False
 
+    def reserve_image_path(self):
+        """Выбрать имя файла, не занятое другим подготовленным раундом"""
+        with self._paths_lock:
+            while True:
+                image_path = f"city_{random.randint(1000, 9999)}.png"
+                if image_path not in self._reserved_paths:
+                    self._reserved_paths.add(image_path)
+                    return image_path
+
+    def release_image_path(self, image_path, delete=False):
+        """Освободить имя файла, при необходимости удалив сам файл"""
+        with self._paths_lock:
+            self._reserved_paths.discard(image_path)
+        if delete:
+            try:
+                os.remove(image_path)
+            except FileNotFoundError:
+                pass
+
+    def prepare_round(self):
+        """Подготовить раунд: выбрать город, зум, смещение и скачать изображение"""
+        city = self.get_random_city()
+        zoom = self.get_random_zoom()
+        offset = self.get_random_offset()
+        image_path = self.reserve_image_path()
+
+        if not self.get_city_image(city, image_path, zoom, offset):
+            self.release_image_path(image_path, delete=True)
+            return None
+
+        return {"city": city, "zoom": zoom, "offset": offset, "image_path": image_path}
+
+    def start_prefetch(self):
+        """Запустить фоновую подготовку следующих раундов"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.prefetch_workers)
+        while len(self._queued_rounds) < self.prefetch_rounds:
+            self._queued_rounds.append(self._executor.submit(self.prepare_round))
+
+    def next_round(self):
+        """Взять готовый раунд из очереди и сразу заказать следующий"""
+        self.start_prefetch()
+        future = self._queued_rounds.popleft()
+        self.start_prefetch()
+        # Ждать приходится только в самом первом раунде
+        return future.result()
+
+    def stop_prefetch(self):
+        """Отменить подготовку раундов и удалить уже скачанные изображения"""
+        if self._executor is None:
+            return
+
+        for future in self._queued_rounds:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+        while self._queued_rounds:
+            future = self._queued_rounds.popleft()
+            if future.cancelled():
+                continue
+            prepared = future.result()
+            if prepared:
+                self.release_image_path(prepared["image_path"], delete=True)
+
     def play_round(self):
         """Провести один раунд игры"""
-        city = self.get_random_city()
-        image_path = f"city_{random.randint(1000, 9999)}.png"
+        prepared = self.next_round()
 
-        if self.get_city_image(city, image_path):
+        if prepared:
+            city = prepared["city"]
+            image_path = prepared["image_path"]
+            self.release_image_path(image_path)
             print("\nНовое изображение города сохранено как", image_path)
             print("\nПопробуйте угадать город!")
             print("Доступные города:")
@@ -104,6 +174,9 @@ class CityGuessingGame:
 
     def play_game(self):
         """Основной игровой цикл"""
+        # Следующие раунды скачиваются, пока игрок читает правила и думает
+        self.start_prefetch()
+
         print("Добро пожаловать в игру 'Угадай город'!")
         print("В каждом раунде вам будет показано изображение города.")
         print("Попробуйте угадать, какой это город из списка.")
@@ -111,21 +184,26 @@ class CityGuessingGame:
         score = 0
         rounds_played = 0
 
-        while True:
-            rounds_played += 1
-            if self.play_round():
-                score += 1
+        try:
+            while True:
+                rounds_played += 1
+                if self.play_round():
+                    score += 1
 
-            print(f"\nВаш текущий счет: {score}/{rounds_played}")
+                print(f"\nВаш текущий счет: {score}/{rounds_played}")
 
-            play_again = input("\nХотите сыграть еще раз? (да/нет): ").strip().lower()
-            if play_again != 'да':
-                break
+                play_again = input("\nХотите сыграть еще раз? (да/нет): ").strip().lower()
+                if play_again != 'да':
+                    break
+        finally:
+            self.stop_prefetch()
 
         print(f"\nИгра окончена! Итоговый счет: {score}/{rounds_played}")
 
 
 def main():
+    load_dotenv()
+
     if not os.getenv('API_KEY'):
         print("Error: API_KEY not found in environment variables")
         return
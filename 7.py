@@ -1,99 +1,136 @@
 import requests
+from envelope_index import EnvelopeIndex
+from geocoder import geocode, request_geocode
+from metrics import span
 import os
 from dotenv import load_dotenv
 import sys
 
-load_dotenv()
+# Окончание названий федеральных округов в составе адреса
+FEDERAL_DISTRICT = "федеральный округ"
 
 
 class DistrictFinder:
     def __init__(self):
-        load_dotenv()
         self.api_key = os.getenv('GEOCODE_API_KEY')
-        self.base_url = "https://geocode-maps.yandex.ru/1.x/"
-
-    def get_coordinates(self, address):
-        """Получить координаты по адресу"""
-        params = {
-            "apikey": self.api_key,
-            "geocode": address,
-            "format": "json"
-        }
+        # Границы уже найденных районов: точку внутри ровно одной из них
+        # можно определить без запроса к API
+        self.districts = EnvelopeIndex()
 
+    def get_address_info(self, address):
+        """Получить результат геокодирования адреса"""
         try:
-            response = requests.get(self.base_url, params=params)
-            if response.status_code == 200:
-                data = response.json()
-                features = data["response"]["GeoObjectCollection"]["featureMember"]
-
-                if features:
-                    coords_str = features[0]["GeoObject"]["Point"]["pos"]
-                    return coords_str.split()
-                else:
-                    print("Адрес не найден")
-                    return None
+            result = geocode(self.api_key, address)
 
+            if result:
+                return result
             else:
-                print(f"Ошибка получения координат: {response.status_code}")
+                print("Адрес не найден")
                 return None
 
+        except requests.HTTPError as e:
+            print(f"Ошибка получения координат: {e.response.status_code}")
+            return None
+
         except Exception as e:
             print(f"Ошибка при запросе координат: {e}")
             return None
 
-    def get_district(self, coords):
-        """Получить район по координатам"""
-        params = {
-            "apikey": self.api_key,
-            "geocode": f"{coords[0]},{coords[1]}",
-            "kind": "district",
-            "format": "json"
+    def get_coordinates(self, address):
+        """Получить координаты по адресу"""
+        result = self.get_address_info(address)
+        return result["pos"].split() if result else None
+
+    @staticmethod
+    def district_from_components(result):
+        """Получить район из состава адреса, без отдельного запроса"""
+        components = result.get("components") or []
+        districts = [i for i, component in enumerate(components) if component["kind"] == "district"]
+        if not districts:
+            return None
+
+        # Самый мелкий район - последний; описание собираем из вышестоящих
+        # частей адреса, как у Геокодера: "Москва, Россия". Федеральный
+        # округ Геокодер в описание района не включает
+        last = districts[-1]
+        description = []
+        for component in reversed(components[:last]):
+            name = component["name"]
+            if name.endswith(FEDERAL_DISTRICT) or name in description:
+                continue
+            description.append(name)
+
+        return {
+            "name": components[last]["name"],
+            "description": ", ".join(description)
         }
 
+    def lookup_district(self, coords):
+        """
+        Найти район по координатам, ошибки запроса не перехватываются
+
+        Returns:
+            dict: name и description района или None, если район не найден
+
+        Raises:
+            requests.RequestException: Если запрос к Геокодеру не удался
+        """
+        lon, lat = float(coords[0]), float(coords[1])
+
+        known = self.districts.query(lon, lat)
+        if len(known) == 1:
+            return known[0]
+
+        with span("reverse_geocode"):
+            results = request_geocode(self.api_key, f"{coords[0]},{coords[1]}", kind="district", results=1)
+
+        # Найдем первый объект с типом district
+        for result in results:
+            if result["kind"] == "district":
+                district_info = {
+                    "name": result["name"],
+                    "description": result["description"]
+                }
+                if result["envelope"]:
+                    self.districts.insert(result["envelope"], district_info,
+                                          key=(result["name"], result["description"]))
+                return district_info
+
+        return None
+
+    def get_district(self, coords):
+        """Получить район по координатам"""
         try:
-            response = requests.get(self.base_url, params=params)
-            if response.status_code == 200:
-                data = response.json()
-                features = data["response"]["GeoObjectCollection"]["featureMember"]
-
-                # Найдем первый объект с типом district
-                for feature in features:
-                    geo_object = feature["GeoObject"]
-                    meta_data = geo_object.get("metaDataProperty", {}).get("GeocoderMetaData", {})
-
-                    # Получаем информацию о типе объекта и его названии
-                    if meta_data.get("kind") == "district":
-                        district_name = geo_object.get("name", "")
-                        district_description = geo_object.get("description", "")
-                        return {
-                            "name": district_name,
-                            "description": district_description
-                        }
+            district_info = self.lookup_district(coords)
 
+            if district_info is None:
                 print("Район не найден")
-                return None
+            return district_info
 
-            else:
-                print(f"Ошибка получения района: {response.status_code}")
-                return None
+        except requests.HTTPError as e:
+            print(f"Ошибка получения района: {e.response.status_code}")
+            return None
 
         except Exception as e:
             print(f"Ошибка при запросе района: {e}")
             return None
 
+    @span("find_district")
     def find_district(self, address):
-        """Основной метод для поиска района по адресу"""
+        """Основной метод для поиска района по адресу, возвращает найденный район или None"""
         print(f"\nИщем район для адреса: {address}")
 
         # Получаем координаты
-        coords = self.get_coordinates(address)
-        if not coords:
-            return
+        result = self.get_address_info(address)
+        if not result:
+            return None
 
+        coords = result["pos"].split()
         print(f"Найдены координаты: {coords[0]}, {coords[1]}")
 
-        # Получаем район
-        district_info = self.get_district(coords)
+        # Район обычно уже есть в составе адреса; обратный запрос нужен,
+        # только если его там нет
+        district_info = self.district_from_components(result) or self.get_district(coords)
         if district_info:
             print("\nНайдена информация о районе:")
             print(f"Название: {district_info['name']}")
@@ -101,9 +138,12 @@ class DistrictFinder:
                 print(f"Описание: {district_info['description']}")
         else:
             print("Не удалось определить район")
+        return district_info
 
 
 def main():
+    load_dotenv()
+
     # Проверяем наличие API ключа
     if not os.getenv('GEOCODE_API_KEY'):
         print("Ошибка: API_KEY не найден в переменных окружения")
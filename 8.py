@@ -1,55 +1,275 @@
-import math
+"""
+Расстояние между двумя адресами.
+
+Без аргументов спрашивает адреса дома и университета. С аргументами
+обрабатывает файл пар адресов (CSV или JSONL) потоково:
+
+    python 8.py pairs.csv distances.csv --workers 16
+
+Каждый уникальный адрес геокодируется один раз за запуск, запросы идут
+параллельно, расстояния считаются векторно порциями по --chunk-size пар,
+а результаты дописываются в выходной файл по мере готовности.
+"""
+import argparse
+import csv
+import json
 import os
+import time
+from collections import OrderedDict
+from functools import partial
+from itertools import islice
 
 import requests
 from dotenv import load_dotenv
 
+import geocoder
+from geo import METHODS, lonlat_distance
+from geocoder import geocode
+
+# Пар адресов в одной порции
+CHUNK_SIZE = 10000
+# Сколько координат уникальных адресов держать в памяти; вытесненные
+# адреса снова берутся из кэшей геокодера
+MAX_ADDRESSES = 1000000
+JSONL_EXTENSIONS = (".jsonl", ".ndjson")
+OUTPUT_FIELDS = ["origin", "destination", "distance", "error"]
+# Ошибка для пары, у которой не хватает адреса
+MISSING_ADDRESS = "Адрес не указан"
+
 
 def get_coordinates(address, api_key):
     """
     Получает координаты (долгота, широта) для указанного адреса
     """
-    url = f"https://geocode-maps.yandex.ru/1.x/"
-    params = {
-        "apikey": api_key,
-        "geocode": address,
-        "format": "json",
-    }
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-
-    geo_data = response.json()
-    try:
-        pos = geo_data["response"]["GeoObjectCollection"]["featureMember"][0]["GeoObject"]["Point"]["pos"]
-        lon, lat = map(float, pos.split())
-        return lon, lat
-    except (KeyError, IndexError):
+    result = geocode(api_key, address)
+
+    if result is None:
         raise ValueError(f"Не удалось найти координаты для адреса: {address}")
 
+    lon, lat = map(float, result["pos"].split())
+    return lon, lat
 
-def lonlat_distance(a, b):
+
+def is_jsonl(path):
+    return path.lower().endswith(JSONL_EXTENSIONS)
+
+
+def read_pairs(path):
     """
-    Считает расстояние между двумя точками (долгота, широта) в метрах
+    Читает пары адресов из файла по одной
+
+    CSV: колонки origin и destination, если есть такой заголовок, иначе
+    первые две колонки. JSONL: объекты с ключами origin и destination.
+
+    Yields:
+        tuple: (origin, destination), отсутствующий или пустой адрес - None
     """
-    degree_to_meters_factor = 111 * 1000  # 111 километров в метрах
-    a_lon, a_lat = a
-    b_lon, b_lat = b
+    with open(path, encoding="utf-8", newline="") as file:
+        if is_jsonl(path):
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record.get("origin") or None, record.get("destination") or None
+            return
+
+        rows = csv.reader(file)
+        first = next(rows, None)
+        if first is None:
+            return
+        if "origin" in first and "destination" in first:
+            columns = first.index("origin"), first.index("destination")
+        else:
+            columns = 0, 1
+            yield _cell(first, 0), _cell(first, 1)
+        for row in rows:
+            if row:
+                yield _cell(row, columns[0]), _cell(row, columns[1])
 
-    # Берем среднюю по широте точку и считаем коэффициент для нее
-    radians_lattitude = math.radians((a_lat + b_lat) / 2.0)
-    lat_lon_factor = math.cos(radians_lattitude)
 
-    # Вычисляем смещения в метрах по вертикали и горизонтали
-    dx = abs(a_lon - b_lon) * degree_to_meters_factor * lat_lon_factor
-    dy = abs(a_lat - b_lat) * degree_to_meters_factor
+def _cell(row, index):
+    """Адрес из колонки CSV, или None, если строка короче или ячейка пустая"""
+    if index < len(row) and row[index].strip():
+        return row[index]
+    return None
+
+
+class ResultWriter:
+    """Дописывает результаты в CSV или JSONL файл"""
+
+    def __init__(self, path):
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._jsonl = is_jsonl(path)
+        if not self._jsonl:
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(OUTPUT_FIELDS)
+
+    def write(self, rows):
+        """Записывает строки (origin, destination, distance или None, error или "")"""
+        for origin, destination, distance, error in rows:
+            if self._jsonl:
+                record = {"origin": origin, "destination": destination,
+                          "distance": None if distance is None else round(distance, 2)}
+                if error:
+                    record["error"] = error
+                self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            else:
+                self._csv.writerow([origin, destination, "" if distance is None else f"{distance:.2f}", error])
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _is_final(result):
+    """Результат геокодирования, который не изменится при повторном запросе"""
+    if not isinstance(result, Exception):
+        return True
+    # "Адрес не найден" из get_coordinates; обрезанный ответ - ошибка запроса
+    return isinstance(result, ValueError) and not isinstance(result, (requests.RequestException, json.JSONDecodeError))
+
+
+def _error_text(error):
+    """
+    Текст ошибки для файла результатов
+
+    Текст исключений requests содержит адрес запроса вместе с ключом API,
+    поэтому в файл попадает только код ответа или тип ошибки.
+    """
+    if isinstance(error, requests.HTTPError):
+        return f"HTTP {error.response.status_code}"
+    if _is_final(error):
+        return str(error)
+    return type(error).__name__
 
-    # Вычисляем расстояние между точками
-    distance = math.sqrt(dx * dx + dy * dy)
-    return distance
+
+def _cache_hits():
+    from geocode_cache import get_default_cache
+
+    hits = geocoder.memory_cache.stats()["hits"]
+    cache = get_default_cache()
+    if cache is not None:
+        hits += cache.stats()["hits"]
+    return hits
+
+
+def process_file(api_key, input_path, output_path, method="equirectangular",
+                 chunk_size=CHUNK_SIZE, max_workers=None):
+    """
+    Считает расстояния для всех пар адресов из файла
+
+    Args:
+        api_key (str): Ключ API Геокодера
+        input_path (str): Файл пар адресов (CSV или JSONL)
+        output_path (str): Файл результатов (CSV или JSONL)
+        method (str): Способ расчёта расстояния, один из geo.METHODS
+        chunk_size (int): Пар адресов в одной порции
+        max_workers (int): Параллельных запросов к Геокодеру
+            (по умолчанию batch_geocode.DEFAULT_CONCURRENCY)
+
+    Returns:
+        dict: pairs, failed (пары без расстояния), geocoded (запрошенных
+            адресов, повторные запросы после ошибок и вытеснения тоже
+            считаются), cache_hits, seconds и pairs_per_second
+    """
+    # Нужны только пакетному режиму, интерактивный их не загружает
+    import numpy as np
+    from batch_geocode import DEFAULT_CONCURRENCY, geocode_many
+    from geo import paired_distances
+
+    max_workers = max_workers or DEFAULT_CONCURRENCY
+    pairs = read_pairs(input_path)
+    writer = ResultWriter(output_path)
+    # адрес -> (долгота, широта) или текст ошибки "адрес не найден"; ошибки
+    # запросов сюда не попадают, такой адрес запрашивается снова в следующей порции
+    known = OrderedDict()
+    geocode_one = partial(get_coordinates, api_key=api_key)
+
+    stats = {"pairs": 0, "failed": 0, "geocoded": 0}
+    hits_before = _cache_hits()
+    started = time.perf_counter()
+
+    try:
+        while True:
+            chunk = list(islice(pairs, chunk_size))
+            if not chunk:
+                break
+
+            new = {address for pair in chunk for address in pair
+                   if address is not None and address not in known}
+            # Ошибки запросов только для этой порции
+            failed = {}
+            for _, address, result in geocode_many(geocode_one, new, max_workers, return_exceptions=True):
+                if not _is_final(result):
+                    failed[address] = _error_text(result)
+                elif isinstance(result, Exception):
+                    known[address] = _error_text(result)
+                else:
+                    known[address] = result
+            stats["geocoded"] += len(new)
+
+            origins = np.full((len(chunk), 2), np.nan)
+            destinations = np.full((len(chunk), 2), np.nan)
+            errors = []
+            for i, (origin, destination) in enumerate(chunk):
+                error = []
+                for address in (origin, destination):
+                    if address is None:
+                        error.append(MISSING_ADDRESS)
+                        continue
+                    if address in failed:
+                        error.append(failed[address])
+                        continue
+                    known.move_to_end(address)
+                    if isinstance(known[address], str):
+                        error.append(known[address])
+                errors.append("; ".join(error))
+                if not error:
+                    origins[i] = known[origin]
+                    destinations[i] = known[destination]
+
+            distances = paired_distances(origins, destinations, method)
+            writer.write(
+                (origin, destination, None if error else float(distance), error)
+                for (origin, destination), distance, error in zip(chunk, distances, errors)
+            )
+
+            stats["pairs"] += len(chunk)
+            stats["failed"] += sum(1 for error in errors if error)
+            while len(known) > MAX_ADDRESSES:
+                known.popitem(last=False)
+    finally:
+        writer.close()
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["pairs_per_second"] = stats["pairs"] / stats["seconds"] if stats["seconds"] else 0.0
+    stats["cache_hits"] = _cache_hits() - hits_before
+    return stats
+
+
+def run_batch(args):
+    api_key = os.getenv('GEOCODE_API_KEY')
+    stats = process_file(api_key, args.input, args.output, args.method, args.chunk_size, args.workers)
+
+    print(f"Обработано пар: {stats['pairs']} (без расстояния: {stats['failed']})")
+    print(f"Запрошено адресов: {stats['geocoded']}, из кэша: {stats['cache_hits']}")
+    print(f"Время: {stats['seconds']:.1f} с, {stats['pairs_per_second']:.0f} пар/с")
 
 
 def main():
     load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Расстояние между адресами")
+    parser.add_argument("input", nargs="?", help="Файл пар адресов (CSV или JSONL)")
+    parser.add_argument("output", nargs="?", default="distances.csv", help="Файл результатов (CSV или JSONL)")
+    parser.add_argument("--method", default="equirectangular", choices=METHODS, help="Способ расчёта расстояния")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Пар адресов в одной порции")
+    parser.add_argument("--workers", type=int, help="Параллельных запросов (по умолчанию GEOCODE_CONCURRENCY или 8)")
+    args = parser.parse_args()
+
+    if args.input:
+        run_batch(args)
+        return
+
     api_key = os.getenv('GEOCODE_API_KEY')
 
     home_address = input("Введите адрес вашего дома: ")
@@ -0,0 +1,86 @@
+"""
+Concurrent batch geocoding.
+
+Works with any of the scripts' geocoding functions: pass a callable that
+takes one address, for example
+``functools.partial(get_coordinates, api_key)`` from 5.py or
+``DistrictFinder().get_coordinates`` from 7.py.
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from scheduler import BULK, priority
+
+# Number of geocoding requests allowed in flight at the same time
+DEFAULT_CONCURRENCY = int(os.getenv("GEOCODE_CONCURRENCY", "8"))
+
+
+def _bulk(geocode, address):
+    with priority(BULK):
+        return geocode(address)
+
+
+def geocode_many(geocode, addresses, max_workers=DEFAULT_CONCURRENCY, return_exceptions=False):
+    """
+    Geocode addresses concurrently and yield results as they finish
+
+    The input is consumed lazily, so at most ``max_workers`` requests are
+    in flight and arbitrarily long iterables can be processed. Requests are
+    sent with bulk priority, so interactive calls sharing the same API key
+    go first.
+
+    Args:
+        geocode (callable): Function taking one address and returning its result
+        addresses (iterable): Addresses to geocode
+        max_workers (int): Maximum number of concurrent requests
+        return_exceptions (bool): Yield exceptions as results instead of raising them
+
+    Yields:
+        tuple: (index, address, result) where index is the input position
+    """
+    addresses = enumerate(addresses)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+
+        def submit(batch):
+            for index, address in batch:
+                pending[executor.submit(_bulk, geocode, address)] = (index, address)
+
+        submit(islice(addresses, max_workers))
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, address = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if not return_exceptions:
+                        for other in pending:
+                            other.cancel()
+                        raise
+                    result = e
+                yield index, address, result
+
+            submit(islice(addresses, len(done)))
+
+
+def geocode_all(geocode, addresses, max_workers=DEFAULT_CONCURRENCY, return_exceptions=False):
+    """
+    Geocode addresses concurrently and return results in input order
+
+    Args:
+        geocode (callable): Function taking one address and returning its result
+        addresses (iterable): Addresses to geocode
+        max_workers (int): Maximum number of concurrent requests
+        return_exceptions (bool): Return exceptions as results instead of raising them
+
+    Returns:
+        list: Results in the same order as ``addresses``
+    """
+    results = {}
+    for index, _, result in geocode_many(geocode, addresses, max_workers, return_exceptions):
+        results[index] = result
+    return [results[index] for index in range(len(results))]
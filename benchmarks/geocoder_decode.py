@@ -0,0 +1,154 @@
+"""
+Bytes transferred and decode time of Geocoder responses.
+
+Compares the old way of reading a response (ten results, the whole body
+decoded with json and every GeoObject summarized) with the lean one
+(results=1, only the GeoObjects decoded, see geocoder.iter_geo_objects).
+
+By default a synthetic response shaped like a real one is used, so no API
+key is needed. With --live the same is measured on real responses for the
+given addresses (needs GEOCODE_API_KEY).
+
+Usage:
+    python benchmarks/geocoder_decode.py
+    python benchmarks/geocoder_decode.py --live "Москва, Тверская 1" "Казань"
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dotenv import load_dotenv  # noqa: E402
+
+import http_client  # noqa: E402
+from geocoder import GEOCODER_URL, iter_geo_objects, summarize  # noqa: E402
+
+DEFAULT_REPEAT = 2000
+
+
+def sample_geo_object(i):
+    """A GeoObject with the structure of a real house-level result"""
+    lon, lat = 37.617698 + i * 0.001, 55.755864 - i * 0.001
+    components = [
+        ("country", "Россия"), ("province", "Центральный федеральный округ"), ("province", "Москва"),
+        ("locality", "Москва"), ("district", "Центральный административный округ"),
+        ("district", "Тверской район"), ("street", "Тверская улица"), ("house", str(i + 1)),
+    ]
+    text = "Россия, Москва, Тверская улица, " + str(i + 1)
+    return {
+        "metaDataProperty": {"GeocoderMetaData": {
+            "precision": "exact",
+            "text": text,
+            "kind": "house",
+            "Address": {
+                "country_code": "RU",
+                "formatted": text,
+                "postal_code": "125009",
+                "Components": [{"kind": kind, "name": name} for kind, name in components],
+            },
+            "AddressDetails": {"Country": {
+                "AddressLine": text,
+                "CountryNameCode": "RU",
+                "CountryName": "Россия",
+                "AdministrativeArea": {
+                    "AdministrativeAreaName": "Москва",
+                    "Locality": {
+                        "LocalityName": "Москва",
+                        "Thoroughfare": {
+                            "ThoroughfareName": "Тверская улица",
+                            "Premise": {"PremiseNumber": str(i + 1), "PostalCode": {"PostalCodeNumber": "125009"}},
+                        },
+                    },
+                },
+            }},
+        }},
+        "name": "Тверская улица, " + str(i + 1),
+        "description": "Москва, Россия",
+        "boundedBy": {"Envelope": {
+            "lowerCorner": f"{lon - 0.004:.6f} {lat - 0.002:.6f}",
+            "upperCorner": f"{lon + 0.004:.6f} {lat + 0.002:.6f}",
+        }},
+        "uri": f"ymapsbm1://geo?data=sample{i}",
+        "Point": {"pos": f"{lon:.6f} {lat:.6f}"},
+    }
+
+
+def sample_response(results):
+    """Body of a Geocoder response with the given number of results"""
+    return json.dumps({"response": {"GeoObjectCollection": {
+        "metaDataProperty": {"GeocoderResponseMetaData": {
+            "request": "Москва, Тверская 1", "results": str(results), "found": str(results),
+        }},
+        "featureMember": [{"GeoObject": sample_geo_object(i)} for i in range(results)],
+    }}}, ensure_ascii=False).encode("utf-8")
+
+
+def decode_full(body):
+    features = json.loads(body)["response"]["GeoObjectCollection"]["featureMember"]
+    return [summarize(feature["GeoObject"]) for feature in features][0]
+
+
+def decode_lean(body):
+    return summarize(next(iter_geo_objects(body.decode("utf-8"))))
+
+
+def time_decode(decode, body, repeat):
+    """Microseconds per decode"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        decode(body)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def measure(full_body, lean_body, repeat):
+    assert decode_full(full_body)["pos"] == decode_lean(lean_body)["pos"]
+    full_us = time_decode(decode_full, full_body, repeat)
+    lean_us = time_decode(decode_lean, lean_body, repeat)
+    # The decoder alone, on the same ten-result body
+    first_only_us = time_decode(decode_lean, full_body, repeat)
+    return {
+        "full_bytes": len(full_body),
+        "lean_bytes": len(lean_body),
+        "full_decode_us": round(full_us, 1),
+        "first_only_decode_us": round(first_only_us, 1),
+        "lean_decode_us": round(lean_us, 1),
+        "bytes_ratio": round(len(full_body) / len(lean_body), 2),
+        "decode_speedup": round(full_us / lean_us, 2),
+    }
+
+
+def fetch(api_key, address, results):
+    response = http_client.get(GEOCODER_URL, params={
+        "apikey": api_key, "geocode": address, "format": "json", "results": results,
+    })
+    response.raise_for_status()
+    return response.content
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Geocoder response size and decode time")
+    parser.add_argument("addresses", nargs="*", help="Addresses for --live")
+    parser.add_argument("--live", action="store_true", help="Measure real responses")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Decodes per measurement")
+    args = parser.parse_args()
+
+    report = {}
+    if args.live:
+        load_dotenv()
+        api_key = os.getenv("GEOCODE_API_KEY")
+        if not api_key or not args.addresses:
+            print("Error: --live needs GEOCODE_API_KEY and at least one address")
+            sys.exit(1)
+        for address in args.addresses:
+            report[address] = measure(fetch(api_key, address, 10), fetch(api_key, address, 1), args.repeat)
+    else:
+        report["synthetic"] = measure(sample_response(10), sample_response(1), args.repeat)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Startup time of the command line entry point.
+
+For every cli.py command a fresh interpreter imports the command's script
+(without running it), several times over, and the median wall time is
+reported together with the heavy third-party modules the import pulled in.
+"cli" is the bare ``cli.py --help`` startup. Nothing touches the network.
+
+Usage:
+    python benchmarks/startup.py --repeat 10 --out startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cli import COMMANDS  # noqa: E402
+
+HEAVY_MODULES = ("requests", "numpy", "PIL", "dotenv")
+
+PROBE = """
+import sys
+sys.path.insert(0, {root!r})
+import cli
+if {command!r}:
+    cli.load({command!r}, {argv!r})
+print(",".join(name for name in {heavy!r} if name in sys.modules))
+"""
+
+
+def measure(command, argv, repeat):
+    code = PROBE.format(root=ROOT, command=command, argv=argv, heavy=HEAVY_MODULES)
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True,
+                                capture_output=True, text=True).stdout
+        times.append((time.perf_counter() - started) * 1000)
+    return {
+        "median_ms": round(statistics.median(times), 1),
+        "min_ms": round(min(times), 1),
+        "heavy_modules": [name for name in output.strip().split(",") if name],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time of the cli.py commands")
+    parser.add_argument("--repeat", type=int, default=10, help="Interpreter starts per command")
+    parser.add_argument("--out", help="Write the report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = {"python": sys.version.split()[0], "repeat": args.repeat, "commands": {}}
+    targets = [("cli", "", ())] + [(name, name, ()) for name in COMMANDS] + [("pharmacy --osm", "pharmacy", ("--osm",))]
+    for label, command, argv in targets:
+        report["commands"][label] = measure(command, argv, args.repeat)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Local stand-in for the Yandex Maps and Overpass endpoints.
+
+Requests arrive through http_client's HTTP_HOST_OVERRIDE, so the first path
+segment is the original host:
+
+    /static-maps.yandex.ru/1.x/      PNG image
+    /geocode-maps.yandex.ru/1.x/     Geocoder JSON (kind=district answers a district)
+    /search-maps.yandex.ru/v1/       Organization search JSON
+    /overpass-api.de/api/interpreter Overpass JSON
+
+Payloads are synthetic unless --payloads points at a directory holding
+recorded ones (static-maps.png, geocode.json, search.json, overpass.json),
+which are then served as is. Every response can be delayed and replaced by
+a 500 or a 429 with the given probabilities.
+
+Usage:
+    python benchmarks/stub_server.py --port 8765 --latency 20 --jitter 5 --throttle-rate 0.01
+"""
+import argparse
+import json
+import os
+import random
+import re
+import struct
+import sys
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from geocoder_decode import sample_geo_object  # noqa: E402
+
+PAYLOAD_FILES = {
+    "static-maps.yandex.ru": "static-maps.png",
+    "geocode-maps.yandex.ru": "geocode.json",
+    "search-maps.yandex.ru": "search.json",
+    "overpass-api.de": "overpass.json",
+}
+SEARCH_RESULTS = 10
+OVERPASS_NODES = 50
+AROUND = re.compile(r"around:(\d+),([-\d.]+),([-\d.]+)")
+
+
+def blank_png(width=650, height=450):
+    """A plain light grey RGB PNG of Static Maps' default size"""
+    def chunk(chunk_type, data):
+        return (struct.pack(">I", len(data)) + chunk_type + data
+                + struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+    row = b"\x00" + b"\xee" * (width * 3)
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * height))
+            + chunk(b"IEND", b""))
+
+
+def _seed(text):
+    return zlib.crc32(text.encode("utf-8")) % 1000
+
+
+def geocode_payload(query):
+    geocode = query.get("geocode", [""])[0]
+    geo_object = sample_geo_object(_seed(geocode))
+    if query.get("kind", [""])[0] == "district":
+        meta_data = geo_object["metaDataProperty"]["GeocoderMetaData"]
+        meta_data["kind"] = "district"
+        meta_data["Address"]["Components"] = meta_data["Address"]["Components"][:6]
+        geo_object["name"] = "Тверской район"
+        geo_object["description"] = "Центральный административный округ, Москва, Россия"
+    results = int(query.get("results", ["10"])[0])
+    return {"response": {"GeoObjectCollection": {
+        "metaDataProperty": {"GeocoderResponseMetaData": {"request": geocode, "results": str(results)}},
+        "featureMember": [{"GeoObject": geo_object}] * results,
+    }}}
+
+
+def search_payload(query):
+    lon, lat = map(float, query.get("ll", ["37.6176,55.7558"])[0].split(","))
+    rng = random.Random(f"{lon},{lat}")
+    return {"type": "FeatureCollection", "features": [{
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lon + rng.uniform(-0.01, 0.01),
+                                                      lat + rng.uniform(-0.01, 0.01)]},
+        "properties": {"CompanyMetaData": {
+            "name": f"Аптека {i + 1}",
+            "address": f"Москва, улица {i + 1}",
+            "Hours": {"text": "ежедневно, 08:00–22:00"},
+        }},
+    } for i in range(SEARCH_RESULTS)]}
+
+
+def overpass_payload(body):
+    match = AROUND.search(body)
+    lat, lon = (float(match.group(2)), float(match.group(3))) if match else (55.7558, 37.6176)
+    rng = random.Random(f"{lon},{lat}")
+    return {"version": 0.6, "elements": [{
+        "type": "node",
+        "id": 1000 + i,
+        "lat": lat + rng.uniform(-0.015, 0.015),
+        "lon": lon + rng.uniform(-0.015, 0.015),
+        "tags": {"amenity": "pharmacy", "name": f"Аптека {i + 1}"},
+    } for i in range(OVERPASS_NODES)]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+    options = None
+    recorded = {}
+    png = b""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_request(b"")
+
+    def do_POST(self):
+        self.handle_request(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+
+    def send_body(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self, body):
+        options = self.options
+        delay = options.latency + random.uniform(-options.jitter, options.jitter)
+        time.sleep(max(delay, 0) / 1000)
+
+        roll = random.random()
+        if roll < options.throttle_rate:
+            return self.send_body(429, b'{"message": "Too Many Requests"}', "application/json",
+                                  [("Retry-After", str(options.retry_after))])
+        if roll < options.throttle_rate + options.error_rate:
+            return self.send_body(500, b'{"message": "Internal Server Error"}', "application/json")
+
+        parts = urlsplit(self.path)
+        host = parts.path.lstrip("/").split("/", 1)[0]
+        query = parse_qs(parts.query)
+        if host in self.recorded:
+            content_type = "image/png" if host == "static-maps.yandex.ru" else "application/json"
+            return self.send_body(200, self.recorded[host], content_type)
+
+        if host == "static-maps.yandex.ru":
+            return self.send_body(200, self.png, "image/png")
+        if host == "geocode-maps.yandex.ru":
+            payload = geocode_payload(query)
+        elif host == "search-maps.yandex.ru":
+            payload = search_payload(query)
+        elif host == "overpass-api.de":
+            payload = overpass_payload(parse_qs(body.decode("utf-8")).get("data", [""])[0])
+        else:
+            return self.send_body(404, b'{"message": "Unknown endpoint"}', "application/json")
+        self.send_body(200, json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                       "application/json; charset=utf-8")
+
+
+def load_recorded(directory):
+    recorded = {}
+    for host, name in PAYLOAD_FILES.items():
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                recorded[host] = f.read()
+    return recorded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Yandex Maps and Overpass APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    parser.add_argument("--latency", type=float, default=0, help="Mean response delay, ms")
+    parser.add_argument("--jitter", type=float, default=0, help="Random +- added to the delay, ms")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of 500 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="Share of 429 responses")
+    parser.add_argument("--retry-after", type=float, default=0.05, help="Retry-After of 429 responses, s")
+    parser.add_argument("--payloads", help="Directory with recorded payloads")
+    args = parser.parse_args()
+
+    StubHandler.options = args
+    StubHandler.png = blank_png()
+    StubHandler.recorded = load_recorded(args.payloads) if args.payloads else {}
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    # The benchmark runner waits for this line to learn the port
+    print(f"Listening on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Offline benchmark of the scripts' entry points.
+
+Starts benchmarks/stub_server.py, points http_client at it with
+HTTP_HOST_OVERRIDE, turns the on-disk caches off and calls every entry
+point at each concurrency level. Every (scenario, concurrency) run happens
+in a fresh process, so its peak RSS is its own, and the in-memory caches
+start empty; inputs differ from call to call so they are not hit either.
+
+The report is JSON: for every run, calls, errors, throughput (calls/s),
+p50/p99/max latency (ms) and peak RSS (KB).
+
+Usage:
+    python benchmarks/suite.py --concurrency 1,8,32 --calls 200 --latency 20 --jitter 5 --out before.json
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, ROOT)
+
+SCENARIOS = ["map", "path", "city", "pharmacy", "pharmacy_osm", "district", "distance"]
+API_KEY = "benchmark"
+
+
+def load_script(name):
+    """Import one of the numbered scripts (1.py, 2.py, ...) as a module"""
+    spec = importlib.util.spec_from_file_location(f"script_{name}", os.path.join(ROOT, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _point(i):
+    """A different point near Moscow for every call"""
+    return 37.45 + (i % 997) * 0.0003, 55.65 + (i % 991) * 0.0002
+
+
+def make_scenario(name):
+    """
+    Build a scenario function
+
+    Returns:
+        callable: Function (i) -> bool, True if the i-th call succeeded
+    """
+    if name == "map":
+        script = load_script("1")
+
+        def run(i):
+            lon, lat = _point(i)
+            stadiums = {f"Stadium {j}": f"{lon + j * 0.01:.6f},{lat + j * 0.005:.6f}" for j in range(3)}
+            return bool(script.get_map_image(API_KEY, stadiums))
+    elif name == "path":
+        script = load_script("2")
+
+        def run(i):
+            lon, lat = _point(i)
+            return bool(script.visualize_path(API_KEY, [(lon + j * 0.004, lat + (j % 3) * 0.003) for j in range(20)]))
+    elif name == "city":
+        script = load_script("4")
+
+        def run(i):
+            return script.get_city_coordinates(API_KEY, f"City {i}") is not None
+    elif name == "pharmacy":
+        script = load_script("5")
+
+        def run(i):
+            return script.find_nearest_pharmacy(API_KEY, _point(i)) is not None
+    elif name == "pharmacy_osm":
+        script = load_script("5_1")
+
+        def run(i):
+            return script.find_nearest_pharmacy_osm(_point(i)) is not None
+    elif name == "district":
+        finder = load_script("7").DistrictFinder()
+
+        def run(i):
+            return finder.find_district(f"Москва, улица {i}") is not None
+    elif name == "distance":
+        script = load_script("8")
+
+        def run(i):
+            origin = script.get_coordinates(f"Home {i}", API_KEY)
+            destination = script.get_coordinates(f"University {i}", API_KEY)
+            return script.lonlat_distance(origin, destination) >= 0
+    else:
+        raise ValueError(f"Unknown scenario: {name}")
+    return run
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_scenario(name, concurrency, calls, workdir):
+    """Run one scenario in the current process and measure it"""
+    os.chdir(workdir)
+    # The scripts report progress and errors with print
+    with contextlib.redirect_stdout(io.StringIO()):
+        run = make_scenario(name)
+        run(-1)  # warm up imports and the connection pool
+
+        def timed(i):
+            started = time.perf_counter()
+            try:
+                ok = run(i)
+            except Exception:
+                ok = False
+            return ok, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(timed, range(calls)))
+        elapsed = time.perf_counter() - started
+
+    latencies = [latency * 1000 for _, latency in results]
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "calls": calls,
+        "errors": sum(1 for ok, _ in results if not ok),
+        "throughput": round(calls / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "max_ms": round(max(latencies), 2),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+@contextlib.contextmanager
+def stub_server(args):
+    command = [
+        sys.executable, os.path.join(BENCHMARKS_DIR, "stub_server.py"), "--port", "0",
+        "--latency", str(args.latency), "--jitter", str(args.jitter),
+        "--error-rate", str(args.error_rate), "--throttle-rate", str(args.throttle_rate),
+        "--retry-after", str(args.retry_after),
+    ]
+    if args.payloads:
+        command += ["--payloads", args.payloads]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    try:
+        line = process.stdout.readline()
+        if not line.startswith("Listening on "):
+            raise RuntimeError("Stub server failed to start")
+        yield line.split()[-1]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the entry points")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenarios")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--calls", type=int, default=100, help="Calls per run")
+    parser.add_argument("--latency", type=float, default=20, help="Stub response delay, ms")
+    parser.add_argument("--jitter", type=float, default=5, help="Random +- added to the delay, ms")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of 500 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="Share of 429 responses")
+    parser.add_argument("--retry-after", type=float, default=0.05, help="Retry-After of 429 responses, s")
+    parser.add_argument("--rate-limit", type=float, default=1e9,
+                        help="Client-side requests per second per key and endpoint (default: unlimited)")
+    parser.add_argument("--payloads", help="Directory with recorded payloads for the stub server")
+    parser.add_argument("--out", help="Write the report to this file instead of stdout")
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    with stub_server(args) as base_url, tempfile.TemporaryDirectory() as workdir:
+        # Read at import time by the child processes
+        os.environ.update({
+            "HTTP_HOST_OVERRIDE": base_url,
+            "HTTP_POOL_SIZE": str(max(levels)),
+            "API_RATE_LIMIT": str(args.rate_limit),
+            "API_RATE_BURST": str(args.rate_limit),
+            "GEOCODE_CACHE_PATH": "",
+            "STATIC_MAP_CACHE_DIR": "",
+            "API_KEY": API_KEY,
+            "GEOCODE_API_KEY": API_KEY,
+        })
+
+        runs = []
+        for name in scenarios:
+            for level in levels:
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                    result = executor.submit(run_scenario, name, level, args.calls, workdir).result()
+                print(f"{name:>13} x{level:<3} {result['throughput']:>8} calls/s  "
+                      f"p50 {result['p50_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  "
+                      f"errors {result['errors']}", file=sys.stderr)
+                runs.append(result)
+
+    report = {
+        "settings": {key: value for key, value in vars(args).items() if key != "out"},
+        "runs": runs,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Single entry point for all the scripts.
+
+Usage:
+    python cli.py <command> [arguments]
+
+    map           Moscow stadiums on a map (1.py)
+    path          Length and map of a path (2.py)
+    satellite     Satellite image of a location (3.py)
+    southernmost  Southernmost of the entered cities (4.py)
+    pharmacy      Nearest pharmacy: Yandex search, or OpenStreetMap with --osm (5.py, 5_1.py)
+    game          City guessing game (6.py)
+    district      District of an address (7.py)
+    distance      Distance between addresses, or a whole file of pairs (8.py)
+    serve         Long-running JSON HTTP service (server.py)
+
+Arguments after the command are passed on to the script. Only the chosen
+command's script is imported, so requests, numpy, Pillow and the rest are
+loaded only by the commands that use them; this module itself imports
+nothing beyond the standard library.
+"""
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+COMMANDS = {
+    "map": ("1", "Moscow stadiums on a map"),
+    "path": ("2", "Length and map of a path"),
+    "satellite": ("3", "Satellite image of a location"),
+    "southernmost": ("4", "Southernmost of the entered cities"),
+    "pharmacy": ("5", "Nearest pharmacy (--osm: OpenStreetMap)"),
+    "game": ("6", "City guessing game"),
+    "district": ("7", "District of an address"),
+    "distance": ("8", "Distance between addresses"),
+    "serve": ("server", "JSON HTTP service"),
+}
+
+
+def load(command, argv=()):
+    """
+    Import the script behind a command
+
+    Args:
+        command (str): One of COMMANDS
+        argv (sequence): Command arguments; "pharmacy --osm" picks 5_1.py
+
+    Returns:
+        module: The script, not yet run
+    """
+    script = COMMANDS[command][0]
+    if command == "pharmacy" and "--osm" in argv:
+        script = "5_1"
+    spec = importlib.util.spec_from_file_location(f"script_{script}", os.path.join(ROOT, f"{script}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def usage():
+    lines = ["Usage: python cli.py <command> [arguments]", "", "Commands:"]
+    lines += [f"  {name:<14}{description}" for name, (_, description) in COMMANDS.items()]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+    command, arguments = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f"Unknown command: {command}\n\n{usage()}")
+        return 2
+
+    module = load(command, arguments)
+    # The scripts read their own arguments from sys.argv
+    sys.argv = [f"cli.py {command}"] + [argument for argument in arguments if argument != "--osm"]
+    module.main()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
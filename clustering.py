@@ -0,0 +1,96 @@
+"""
+Zoom-aware marker clustering for Static Maps.
+
+Points are binned into a square grid in pixel space at the target zoom,
+and every non-empty cell becomes one marker at the centroid of its points,
+labelled with their count. The cells grow until the markers fit within the
+API limits on marker count and URL length.
+"""
+from urllib.parse import quote
+
+import numpy as np
+
+from geo import as_points
+from mercator import lonlat_to_pixels
+from polyline import MAX_URL_LENGTH, coordinate_decimals
+
+# Most markers a single Static Maps request accepts
+MAX_MARKERS = 100
+# Grid cell size in pixels, about the width of a marker
+DEFAULT_CELL_SIZE = 32
+# Largest number a pm2 marker can show
+MAX_MARKER_LABEL = 99
+
+
+def cluster_points(points, zoom, cell_size=DEFAULT_CELL_SIZE):
+    """
+    Merge points falling into the same grid cell at the given zoom
+
+    Args:
+        points (array-like): (longitude, latitude) pairs, shape (n, 2)
+        zoom (float): Zoom level of the map
+        cell_size (float): Grid cell size in pixels
+
+    Returns:
+        tuple: (centroids, counts) arrays of shape (m, 2) and (m,)
+    """
+    points = as_points(points)
+    if not len(points):
+        return points, np.zeros(0, dtype=np.int64)
+
+    cells = np.floor(lonlat_to_pixels(points, zoom) / cell_size).astype(np.int64)
+    # Pixel coordinates fit into 32 bits up to zoom 23, so one integer identifies a cell
+    cell_ids = (cells[:, 0] << 32) | cells[:, 1]
+    _, cluster, counts = np.unique(cell_ids, return_inverse=True, return_counts=True)
+
+    centroids = np.empty((len(counts), 2))
+    centroids[:, 0] = np.bincount(cluster, weights=points[:, 0]) / counts
+    centroids[:, 1] = np.bincount(cluster, weights=points[:, 1]) / counts
+    return centroids, counts
+
+
+def format_markers(centroids, counts, decimals=6, style="pm2rdm", cluster_style="pm2blm"):
+    """
+    Build a "pt" value from clusters
+
+    Single points get ``style``; clusters get ``cluster_style`` with their
+    size as the label, or a large unlabelled marker above MAX_MARKER_LABEL.
+    """
+    markers = []
+    for (lon, lat), count in zip(centroids, counts):
+        if count == 1:
+            marker_style = style
+        elif count <= MAX_MARKER_LABEL:
+            marker_style = f"{cluster_style}{count}"
+        else:
+            marker_style = cluster_style[:-1] + "l"
+        markers.append(f"{lon:.{decimals}f},{lat:.{decimals}f},{marker_style}")
+    return "~".join(markers)
+
+
+def cluster_markers(points, zoom, budget=MAX_URL_LENGTH, max_markers=MAX_MARKERS,
+                    cell_size=DEFAULT_CELL_SIZE, style="pm2rdm", cluster_style="pm2blm"):
+    """
+    Cluster points into a "pt" value that fits the API limits
+
+    Args:
+        points (array-like): (longitude, latitude) pairs
+        zoom (float): Zoom level of the map
+        budget (int): URL characters available for the "pt" value
+        max_markers (int): Most markers allowed
+        cell_size (float): Initial grid cell size in pixels, doubled until the markers fit
+        style (str): Style of single-point markers
+        cluster_style (str): Style of cluster markers
+
+    Returns:
+        str: Value for the "pt" parameter
+    """
+    decimals = coordinate_decimals(zoom)
+    while True:
+        centroids, counts = cluster_points(points, zoom, cell_size)
+        markers = format_markers(centroids, counts, decimals, style, cluster_style)
+        if len(counts) <= max(max_markers, 1) and len(quote(markers, safe="")) <= budget:
+            return markers
+        if len(counts) == 1:
+            return markers
+        cell_size *= 2
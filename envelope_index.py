@@ -0,0 +1,128 @@
+"""
+In-memory spatial index of bounding envelopes.
+
+Envelopes are kept in an R-tree packed with the Sort-Tile-Recursive (STR)
+algorithm: boxes are sorted into vertical slices by centre longitude, then
+by centre latitude within each slice, and grouped into nodes of a fixed
+capacity, level by level up to a single root. The tree is rebuilt lazily
+after inserts, which is cheap for the few hundred envelopes a process
+usually learns, and a point query only looks at the nodes containing it.
+NumPy is imported once there is something to index, so an empty index
+costs nothing to create.
+"""
+import threading
+
+DEFAULT_NODE_CAPACITY = 16
+
+
+def _str_order(boxes, capacity):
+    """Leaf order of the boxes according to Sort-Tile-Recursive packing"""
+    import numpy as np
+
+    count = len(boxes)
+    centres = (boxes[:, :2] + boxes[:, 2:]) / 2
+    leaves = -(-count // capacity)
+    slices = int(np.ceil(np.sqrt(leaves)))
+    slice_size = slices * capacity
+
+    order = np.argsort(centres[:, 0], kind="stable")
+    for start in range(0, count, slice_size):
+        part = order[start:start + slice_size]
+        order[start:start + slice_size] = part[np.argsort(centres[part, 1], kind="stable")]
+    return order
+
+
+def _group_bounds(boxes, capacity):
+    """Bounds of each consecutive group of ``capacity`` boxes"""
+    import numpy as np
+
+    starts = np.arange(0, len(boxes), capacity)
+    return np.concatenate([
+        np.minimum.reduceat(boxes[:, :2], starts),
+        np.maximum.reduceat(boxes[:, 2:], starts),
+    ], axis=1)
+
+
+class EnvelopeIndex:
+    def __init__(self, node_capacity=DEFAULT_NODE_CAPACITY):
+        """
+        Args:
+            node_capacity (int): Children per tree node
+        """
+        self.node_capacity = node_capacity
+        self._boxes = []
+        self._values = []
+        self._keys = set()
+        self._tree = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def insert(self, envelope, value, key=None):
+        """
+        Add an envelope
+
+        Args:
+            envelope (tuple): (min_lon, min_lat, max_lon, max_lat)
+            value: Returned by queries that hit the envelope
+            key: Identity of the entry; an entry whose key is already
+                indexed is ignored (default: the envelope itself)
+
+        Returns:
+            bool: True if the entry was added
+        """
+        key = tuple(envelope) if key is None else key
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._keys.add(key)
+            self._boxes.append(tuple(map(float, envelope)))
+            self._values.append(value)
+            self._tree = None
+            return True
+
+    def _build(self):
+        import numpy as np
+
+        boxes = np.array(self._boxes, dtype=np.float64).reshape(-1, 4)
+        order = _str_order(boxes, self.node_capacity)
+        levels = [boxes[order]]
+        while len(levels[-1]) > 1:
+            levels.append(_group_bounds(levels[-1], self.node_capacity))
+        return order, levels, list(self._values)
+
+    def query(self, lon, lat):
+        """
+        Values of all envelopes containing a point (edges included)
+
+        Args:
+            lon (float): Longitude
+            lat (float): Latitude
+
+        Returns:
+            list: Values in no particular order
+        """
+        with self._lock:
+            if not self._values:
+                return []
+            if self._tree is None:
+                self._tree = self._build()
+            order, levels, values = self._tree
+
+        import numpy as np
+
+        nodes = np.zeros(1, dtype=np.int64)
+        for level in reversed(levels):
+            if level is not levels[-1]:
+                # Expand every matching node into the indices of its children
+                nodes = (nodes[:, None] * self.node_capacity + np.arange(self.node_capacity)).ravel()
+                nodes = nodes[nodes < len(level)]
+            boxes = level[nodes]
+            inside = ((boxes[:, 0] <= lon) & (lon <= boxes[:, 2])
+                      & (boxes[:, 1] <= lat) & (lat <= boxes[:, 3]))
+            nodes = nodes[inside]
+            if not len(nodes):
+                return []
+
+        return [values[i] for i in order[nodes]]
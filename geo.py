@@ -0,0 +1,199 @@
+"""
+Distance calculations between (longitude, latitude) points.
+
+Three methods are available:
+
+- "equirectangular": the flat 111 km per degree approximation the scripts
+  have always used, fast and good enough for a few kilometres
+- "haversine": great-circle distance on a sphere
+- "ellipsoid": Lambert's formula on the WGS 84 ellipsoid, within a few
+  metres of the exact geodesic
+
+Apart from lonlat_distance, every function works on NumPy arrays of
+shape (n, 2) and costs a constant number of Python operations whatever the
+number of points. NumPy is imported by those functions, so scripts that only
+measure single distances don't pay for loading it.
+"""
+import math
+
+DEGREE_TO_METERS_FACTOR = 111 * 1000  # 111 kilometers in meters
+EARTH_RADIUS = 6371008.8  # Mean Earth radius in meters
+WGS84_A = 6378137.0  # WGS 84 semi-major axis in meters
+WGS84_F = 1 / 298.257223563  # WGS 84 flattening
+
+METHODS = ("equirectangular", "haversine", "ellipsoid")
+
+# Rows of a distance matrix computed at once, keeps temporaries small
+DEFAULT_CHUNK_SIZE = 1024
+
+
+def lonlat_distance(a, b, method="equirectangular"):
+    """
+    Calculate distance between two points in meters
+
+    Args:
+        a (tuple): (longitude, latitude) of the first point
+        b (tuple): (longitude, latitude) of the second point
+        method (str): One of METHODS
+
+    Returns:
+        float: Distance in meters
+    """
+    a_lon, a_lat = a
+    b_lon, b_lat = b
+
+    if method == "equirectangular":
+        radians_lattitude = math.radians((a_lat + b_lat) / 2.)
+        lat_lon_factor = math.cos(radians_lattitude)
+
+        dx = abs(a_lon - b_lon) * DEGREE_TO_METERS_FACTOR * lat_lon_factor
+        dy = abs(a_lat - b_lat) * DEGREE_TO_METERS_FACTOR
+
+        return math.sqrt(dx * dx + dy * dy)
+
+    return float(_distance(a_lon, a_lat, b_lon, b_lat, method))
+
+
+def as_points(points):
+    """Convert a sequence of (longitude, latitude) pairs to a float64 array of shape (n, 2)"""
+    import numpy as np
+
+    points = np.asarray(points, dtype=np.float64)
+    return points.reshape(-1, 2)
+
+
+def distances_to(origin, points, method="equirectangular"):
+    """
+    Distances from one point to many points
+
+    Args:
+        origin (tuple): (longitude, latitude)
+        points (array-like): (longitude, latitude) pairs, shape (n, 2)
+        method (str): One of METHODS
+
+    Returns:
+        numpy.ndarray: n distances in meters
+    """
+    points = as_points(points)
+    return _distance(origin[0], origin[1], points[:, 0], points[:, 1], method)
+
+
+def paired_distances(a, b, method="equirectangular"):
+    """
+    Distances between a[i] and b[i] for every i
+
+    Args:
+        a (array-like): (longitude, latitude) pairs, shape (n, 2)
+        b (array-like): (longitude, latitude) pairs, shape (n, 2)
+        method (str): One of METHODS
+
+    Returns:
+        numpy.ndarray: n distances in meters
+    """
+    a = as_points(a)
+    b = as_points(b)
+    return _distance(a[:, 0], a[:, 1], b[:, 0], b[:, 1], method)
+
+
+def path_distances(points, method="equirectangular"):
+    """
+    Distances between consecutive points of a path
+
+    Args:
+        points (array-like): (longitude, latitude) pairs, shape (n, 2)
+        method (str): One of METHODS
+
+    Returns:
+        numpy.ndarray: n - 1 segment lengths in meters
+    """
+    points = as_points(points)
+    return paired_distances(points[:-1], points[1:], method)
+
+
+def path_length(points, method="equirectangular"):
+    """Total length of a path in meters"""
+    return float(path_distances(points, method).sum())
+
+
+def iter_distance_matrix(a, b, method="equirectangular", chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Distances from every point of ``a`` to every point of ``b``, in row chunks
+
+    Yields:
+        tuple: (start, block) where block holds the rows start:start + len(block)
+    """
+    a = as_points(a)
+    b = as_points(b)
+    for start in range(0, len(a), chunk_size):
+        rows = a[start:start + chunk_size]
+        yield start, _distance(rows[:, :1], rows[:, 1:], b[:, 0], b[:, 1], method)
+
+
+def distance_matrix(a, b, method="equirectangular", chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Distances from every point of ``a`` to every point of ``b``
+
+    Args:
+        a (array-like): (longitude, latitude) pairs, shape (n, 2)
+        b (array-like): (longitude, latitude) pairs, shape (m, 2)
+        method (str): One of METHODS
+        chunk_size (int): Number of rows computed at once
+
+    Returns:
+        numpy.ndarray: (n, m) matrix of distances in meters
+    """
+    import numpy as np
+
+    a = as_points(a)
+    b = as_points(b)
+    matrix = np.empty((len(a), len(b)))
+    for start, block in iter_distance_matrix(a, b, method, chunk_size):
+        matrix[start:start + len(block)] = block
+    return matrix
+
+
+def _distance(a_lon, a_lat, b_lon, b_lat, method):
+    """Distance kernel on broadcastable arrays of degrees"""
+    import numpy as np
+
+    if method == "equirectangular":
+        lat_lon_factor = np.cos(np.radians((a_lat + b_lat) / 2.))
+        dx = (a_lon - b_lon) * (DEGREE_TO_METERS_FACTOR * lat_lon_factor)
+        dy = (a_lat - b_lat) * DEGREE_TO_METERS_FACTOR
+        return np.hypot(dx, dy)
+
+    if method == "haversine":
+        return EARTH_RADIUS * _central_angle(np.radians(a_lon), np.radians(a_lat),
+                                             np.radians(b_lon), np.radians(b_lat))
+
+    if method == "ellipsoid":
+        return _lambert(a_lon, a_lat, b_lon, b_lat)
+
+    raise ValueError(f"Unknown distance method: {method}")
+
+
+def _central_angle(a_lon, a_lat, b_lon, b_lat):
+    """Great-circle angle between points given in radians (haversine formula)"""
+    import numpy as np
+
+    h = (np.sin((b_lat - a_lat) / 2.) ** 2
+         + np.cos(a_lat) * np.cos(b_lat) * np.sin((b_lon - a_lon) / 2.) ** 2)
+    return 2. * np.arcsin(np.sqrt(np.clip(h, 0., 1.)))
+
+
+def _lambert(a_lon, a_lat, b_lon, b_lat):
+    """Lambert's formula for long lines on the WGS 84 ellipsoid"""
+    import numpy as np
+
+    # Reduced latitudes
+    beta_a = np.arctan((1. - WGS84_F) * np.tan(np.radians(a_lat)))
+    beta_b = np.arctan((1. - WGS84_F) * np.tan(np.radians(b_lat)))
+    sigma = _central_angle(np.radians(a_lon), beta_a, np.radians(b_lon), beta_b)
+
+    p = (beta_a + beta_b) / 2.
+    q = (beta_b - beta_a) / 2.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = (sigma - np.sin(sigma)) * np.sin(p) ** 2 * np.cos(q) ** 2 / np.cos(sigma / 2.) ** 2
+        y = (sigma + np.sin(sigma)) * np.cos(p) ** 2 * np.sin(q) ** 2 / np.sin(sigma / 2.) ** 2
+        distance = WGS84_A * (sigma - WGS84_F / 2. * (x + y))
+    return np.where(sigma == 0., 0., distance)
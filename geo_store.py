@@ -0,0 +1,205 @@
+"""
+Compact store of named points (geocoding results).
+
+Points are kept in parallel arrays instead of tuples or dicts: coordinates
+in one float64 array, names in one UTF-8 blob with offsets. The indexes are
+built once, when the store is created:
+
+- latitude and longitude orders, so the southernmost, northernmost,
+  westernmost and easternmost points are found in O(1)
+- the points themselves are split into latitude stripes holding about
+  sqrt(n) points each and sorted by longitude inside every stripe, so a
+  bounding box is answered with a binary search per overlapping stripe
+- a k-nearest query searches a box that doubles until k points lie
+  within its radius
+
+A store takes 40 bytes per point plus its name, and can be saved to a
+binary file that is memory-mapped when loaded.
+"""
+import struct
+
+import numpy as np
+
+from geo import DEGREE_TO_METERS_FACTOR, as_points, distances_to
+
+MAGIC = b"GEOSTR01"
+# magic, point count, stripe count, names size
+HEADER = struct.Struct("<8sqqq")
+MIN_STRIPE_SIZE = 64
+# First search radius of nearest(), in meters
+INITIAL_RADIUS = 1000.0
+# Half of the Earth's circumference, no two points are further apart
+MAX_RADIUS = 20037508.0
+
+
+class GeoStore:
+    def __init__(self, coords, lat_order, lon_order, stripe_start, stripe_lat, name_start, names_blob):
+        """
+        Wrap arrays in the store layout; use from_records or load to create a store
+
+        Args:
+            coords (numpy.ndarray): (n, 2) float64 (longitude, latitude), stripe by stripe
+                from south to north, sorted by longitude inside a stripe
+            lat_order (numpy.ndarray): int64 row indices sorted by latitude
+            lon_order (numpy.ndarray): int64 row indices sorted by longitude
+            stripe_start (numpy.ndarray): int64 first row of every stripe, plus n at the end
+            stripe_lat (numpy.ndarray): (stripes, 2) float64 lowest and highest latitude of every stripe
+            name_start (numpy.ndarray): int64 offsets of the names in names_blob, n + 1 of them
+            names_blob (bytes-like): UTF-8 names one after another
+        """
+        self.coords = coords
+        self.lat_order = lat_order
+        self.lon_order = lon_order
+        self.stripe_start = stripe_start
+        self.stripe_lat = stripe_lat
+        self.name_start = name_start
+        self.names_blob = names_blob
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Build a store
+
+        Args:
+            records (iterable): Tuples (name, longitude, latitude)
+
+        Returns:
+            GeoStore: The indexed points
+        """
+        names = []
+        coords = []
+        for name, lon, lat in records:
+            names.append(name.encode("utf-8"))
+            coords.append((lon, lat))
+        coords = as_points(coords)
+        count = len(coords)
+
+        # Equal-count latitude stripes, each sorted by longitude
+        stripe_size = max(MIN_STRIPE_SIZE, int(np.sqrt(count)))
+        by_lat = np.argsort(coords[:, 1], kind="stable")
+        stripe_start = np.append(np.arange(0, count, stripe_size), count).astype(np.int64)
+        order = np.concatenate([
+            by_lat[start:end][np.argsort(coords[by_lat[start:end], 0], kind="stable")]
+            for start, end in zip(stripe_start[:-1], stripe_start[1:])
+        ]) if count else by_lat
+        coords = coords[order]
+        names = [names[i] for i in order]
+
+        lat_order = np.argsort(coords[:, 1], kind="stable").astype(np.int64)
+        lon_order = np.argsort(coords[:, 0], kind="stable").astype(np.int64)
+        lats = coords[lat_order, 1]
+        stripe_lat = np.column_stack([lats[stripe_start[:-1]], lats[stripe_start[1:] - 1]])
+
+        name_start = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum([len(name) for name in names], out=name_start[1:])
+        return cls(coords, lat_order, lon_order, stripe_start, stripe_lat, name_start, b"".join(names))
+
+    @classmethod
+    def load(cls, path):
+        """Open a file written by save, memory-mapping its arrays"""
+        with open(path, "rb") as f:
+            magic, count, stripes, names_size = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"Not a geo store file: {path}")
+
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+        offset = HEADER.size
+        arrays = []
+        for dtype, shape in ((np.float64, (count, 2)), (np.int64, (count,)), (np.int64, (count,)),
+                             (np.int64, (stripes + 1,)), (np.float64, (stripes, 2)), (np.int64, (count + 1,))):
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            arrays.append(data[offset:offset + size].view(dtype).reshape(shape))
+            offset += size
+        return cls(*arrays, data[offset:offset + names_size])
+
+    def save(self, path):
+        """Write the store to a binary file"""
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(self), len(self.stripe_lat), len(self.names_blob)))
+            for array in (self.coords, self.lat_order, self.lon_order,
+                          self.stripe_start, self.stripe_lat, self.name_start):
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.write(bytes(self.names_blob))
+
+    def __len__(self):
+        return len(self.coords)
+
+    def name(self, i):
+        """Name of the i-th point"""
+        return bytes(self.names_blob[self.name_start[i]:self.name_start[i + 1]]).decode("utf-8")
+
+    def record(self, i):
+        """The i-th point as (name, (longitude, latitude))"""
+        return self.name(i), (float(self.coords[i, 0]), float(self.coords[i, 1]))
+
+    def southernmost(self):
+        """Index of the point with the lowest latitude, None if the store is empty"""
+        return int(self.lat_order[0]) if len(self) else None
+
+    def northernmost(self):
+        """Index of the point with the highest latitude, None if the store is empty"""
+        return int(self.lat_order[-1]) if len(self) else None
+
+    def westernmost(self):
+        """Index of the point with the lowest longitude, None if the store is empty"""
+        return int(self.lon_order[0]) if len(self) else None
+
+    def easternmost(self):
+        """Index of the point with the highest longitude, None if the store is empty"""
+        return int(self.lon_order[-1]) if len(self) else None
+
+    def within_bbox(self, min_lon, min_lat, max_lon, max_lat):
+        """
+        Points inside a bounding box (edges included)
+
+        Returns:
+            numpy.ndarray: Indices of the points
+        """
+        # Stripes are ordered by latitude and don't overlap
+        first = int(np.searchsorted(self.stripe_lat[:, 1], min_lat, side="left"))
+        last = int(np.searchsorted(self.stripe_lat[:, 0], max_lat, side="right"))
+
+        found = []
+        for stripe in range(first, last):
+            start, end = self.stripe_start[stripe], self.stripe_start[stripe + 1]
+            lons = self.coords[start:end, 0]
+            low = start + np.searchsorted(lons, min_lon, side="left")
+            high = start + np.searchsorted(lons, max_lon, side="right")
+            lats = self.coords[low:high, 1]
+            found.append(np.nonzero((lats >= min_lat) & (lats <= max_lat))[0] + low)
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def nearest(self, lon, lat, k=1):
+        """
+        The k nearest points
+
+        Args:
+            lon (float): Longitude of the query point
+            lat (float): Latitude of the query point
+            k (int): Number of points to return
+
+        Returns:
+            list: Tuples (index, distance in meters), nearest first
+        """
+        k = min(k, len(self))
+        if not k:
+            return []
+
+        radius = INITIAL_RADIUS
+        while True:
+            lat_span = radius / DEGREE_TO_METERS_FACTOR
+            lon_span = lat_span / max(np.cos(np.radians(min(abs(lat) + lat_span, 89.9))), 1e-6)
+            if radius >= MAX_RADIUS:
+                candidates = np.arange(len(self))
+            else:
+                candidates = self.within_bbox(lon - lon_span, lat - lat_span, lon + lon_span, lat + lat_span)
+            distances = distances_to((lon, lat), self.coords[candidates])
+            inside = distances <= radius
+            if inside.sum() >= k or radius >= MAX_RADIUS:
+                break
+            radius = min(radius * 2, MAX_RADIUS)
+
+        if inside.sum() >= k:
+            candidates, distances = candidates[inside], distances[inside]
+        best = np.argsort(distances, kind="stable")[:k]
+        return [(int(candidates[i]), float(distances[i])) for i in best]
@@ -0,0 +1,190 @@
+"""
+Persistent on-disk cache for Yandex Geocoder results.
+
+Results are stored in a single SQLite file keyed by the normalized address
+and request parameters. The database runs in WAL mode so several processes
+can read it while one of them writes.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+from metrics import record_cache
+
+DEFAULT_PATH = os.getenv(
+    "GEOCODE_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "yandex-map-api", "geocode.sqlite3"),
+)
+# Seconds a cached result stays valid (30 days)
+DEFAULT_TTL = float(os.getenv("GEOCODE_CACHE_TTL", str(30 * 24 * 3600)))
+# Maximum number of cached results before the least recently used are evicted
+DEFAULT_MAX_ENTRIES = int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", "100000"))
+
+# Parameters that don't change the result and must not end up in the key
+IGNORED_PARAMS = {"apikey", "format"}
+
+# How many writes happen between two eviction checks
+EVICTION_INTERVAL = 100
+
+# Seconds an access time may lag behind before a hit refreshes it. Eviction
+# only needs a rough order, and this keeps nearly all hits read-only, so they
+# don't queue up for the database's write lock
+ACCESS_UPDATE_INTERVAL = 3600
+
+
+def make_key(address, params=None):
+    """
+    Build a cache key from an address and request parameters
+
+    Args:
+        address (str): Address as typed by the user
+        params (dict): Extra Geocoder parameters (apikey is ignored)
+
+    Returns:
+        str: Cache key
+    """
+    normalized = " ".join(str(address).split()).casefold()
+    params = sorted((k, str(v)) for k, v in (params or {}).items() if k not in IGNORED_PARAMS)
+    return f"{normalized}|{urlencode(params)}"
+
+
+class GeocodeCache:
+    def __init__(self, path=DEFAULT_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS geocode_accessed ON geocode (accessed)")
+        connection.commit()
+
+    def _connection(self):
+        """SQLite connections can't be shared between threads, so keep one per thread"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        """
+        Look up a cached result
+
+        Args:
+            key (str): Key built with make_key
+
+        Returns:
+            tuple: (found, value)
+        """
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute("SELECT value, created, accessed FROM geocode WHERE key = ?", (key,)).fetchone()
+
+        if row is None or now - row[1] > self.ttl:
+            with self._lock:
+                self.misses += 1
+            record_cache("geocode_disk", hit=False)
+            return False, None
+
+        if now - row[2] > ACCESS_UPDATE_INTERVAL:
+            connection.execute("UPDATE geocode SET accessed = ? WHERE key = ?", (now, key))
+            connection.commit()
+        with self._lock:
+            self.hits += 1
+        record_cache("geocode_disk", hit=True)
+        return True, json.loads(row[0])
+
+    def set(self, key, value):
+        """Store a JSON-serializable result under the given key"""
+        connection = self._connection()
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO geocode (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now, now),
+        )
+        connection.commit()
+
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % EVICTION_INTERVAL == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Drop expired results and the least recently used ones above max_entries"""
+        connection = self._connection()
+        connection.execute("DELETE FROM geocode WHERE created < ?", (time.time() - self.ttl,))
+        connection.execute(
+            "DELETE FROM geocode WHERE key IN ("
+            " SELECT key FROM geocode ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        connection.commit()
+
+    def clear(self):
+        """Remove all cached results"""
+        connection = self._connection()
+        connection.execute("DELETE FROM geocode")
+        connection.commit()
+
+    def stats(self):
+        """
+        Get cache statistics
+
+        Returns:
+            dict: hits, misses, hit_ratio and number of stored entries
+        """
+        entries = self._connection().execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+    def close(self):
+        """Close the calling thread's connection"""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """
+    Return the shared cache, or None if GEOCODE_CACHE_PATH is set to an empty string
+    """
+    global _default_cache
+    if not DEFAULT_PATH:
+        return None
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = GeocodeCache()
+    return _default_cache
@@ -0,0 +1,175 @@
+"""
+Shared access to the Yandex Geocoder.
+
+Results are looked up in an in-process LRU cache and then in the on-disk
+geocode cache before a request is sent. Only one result is requested
+unless the caller asks for more, and responses are decoded one GeoObject
+at a time, skipping the collection wrapper, keeping only the fields the
+scripts use.
+"""
+import json
+import os
+import re
+
+import http_client
+from geocode_cache import get_default_cache, make_key
+from memory_cache import MemoryCache
+from metrics import span
+
+GEOCODER_URL = "https://geocode-maps.yandex.ru/1.x/"
+
+memory_cache = MemoryCache(
+    max_entries=int(os.getenv("GEOCODE_MEMORY_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("GEOCODE_MEMORY_CACHE_TTL", "3600")),
+    negative_ttl=float(os.getenv("GEOCODE_NEGATIVE_CACHE_TTL", "300")),
+    name="geocode",
+)
+
+# Key of a GeoObject; never matches inside a JSON string, where quotes are escaped
+GEO_OBJECT_KEY = re.compile(r'"GeoObject"\s*:\s*')
+_decoder = json.JSONDecoder()
+
+
+def iter_geo_objects(text):
+    """
+    Decode the GeoObjects of a Geocoder response one at a time
+
+    Only the GeoObjects themselves are decoded, and decoding stops as soon
+    as the caller stops iterating, so unused results cost a text search at
+    most.
+
+    Args:
+        text (str): Body of a JSON Geocoder response
+
+    Yields:
+        dict: GeoObject
+    """
+    pos = 0
+    while True:
+        match = GEO_OBJECT_KEY.search(text, pos)
+        if match is None:
+            return
+        geo_object, pos = _decoder.raw_decode(text, match.end())
+        yield geo_object
+
+
+def parse_envelope(geo_object):
+    """
+    Bounding box of a GeoObject
+
+    Args:
+        geo_object (dict): GeoObject from a Geocoder response
+
+    Returns:
+        list: [min_lon, min_lat, max_lon, max_lat] or None if the response has no boundedBy
+    """
+    envelope = geo_object.get("boundedBy", {}).get("Envelope")
+    if not envelope:
+        return None
+    lower = [float(value) for value in envelope["lowerCorner"].split()]
+    upper = [float(value) for value in envelope["upperCorner"].split()]
+    return lower + upper
+
+
+def summarize(geo_object):
+    """
+    Keep only the fields of a GeoObject that the scripts use
+
+    Args:
+        geo_object (dict): GeoObject from a Geocoder response
+
+    Returns:
+        dict: pos ("longitude latitude"), name, description, kind, precision,
+            text, envelope (see parse_envelope) and components: the address
+            hierarchy as a list of {"kind", "name"} from country down
+    """
+    meta_data = geo_object.get("metaDataProperty", {}).get("GeocoderMetaData", {})
+    return {
+        "pos": geo_object["Point"]["pos"],
+        "name": geo_object.get("name", ""),
+        "description": geo_object.get("description", ""),
+        "kind": meta_data.get("kind", ""),
+        "precision": meta_data.get("precision", ""),
+        "text": meta_data.get("text", ""),
+        "envelope": parse_envelope(geo_object),
+        "components": [
+            {"kind": component.get("kind", ""), "name": component.get("name", "")}
+            for component in meta_data.get("Address", {}).get("Components", [])
+        ],
+    }
+
+
+def request_geocode(api_key, geocode, limit=None, **params):
+    """
+    Send a Geocoder request and summarize the returned GeoObjects
+
+    Args:
+        api_key (str): Yandex Geocoder API key
+        geocode (str): Address or "longitude,latitude" string
+        limit (int): Decode at most this many GeoObjects (default: all)
+        **params: Extra Geocoder parameters (results, kind, lang, ...)
+
+    Returns:
+        list: Summaries of the returned GeoObjects
+
+    Raises:
+        requests.HTTPError: If the Geocoder answers with an error status
+    """
+    request_params = {
+        "apikey": api_key,
+        "geocode": geocode,
+        "format": "json",
+        **params,
+    }
+
+    response = http_client.get(GEOCODER_URL, params=request_params)
+    response.raise_for_status()
+
+    summaries = []
+    for geo_object in iter_geo_objects(response.content.decode("utf-8")):
+        if limit is not None and len(summaries) >= limit:
+            break
+        summaries.append(summarize(geo_object))
+    return summaries
+
+
+@span("geocode")
+def geocode(api_key, address, **params):
+    """
+    Geocode an address, using the in-memory and on-disk caches when possible
+
+    "Not found" results are kept in memory for a shorter time, and
+    concurrent calls for the same address share one request. Only the
+    first result is used, so only one is requested unless ``results`` is
+    given.
+
+    Args:
+        api_key (str): Yandex Geocoder API key
+        address (str): Address to geocode
+        **params: Extra Geocoder parameters (results, kind, lang, ...)
+
+    Returns:
+        dict: Summary of the first GeoObject (see summarize) or None if not found
+
+    Raises:
+        requests.HTTPError: If the Geocoder answers with an error status
+    """
+    params.setdefault("results", 1)
+    key = make_key(address, params)
+
+    def load():
+        cache = get_default_cache()
+        if cache is not None:
+            found, result = cache.get(key)
+            if found:
+                return result
+
+        results = request_geocode(api_key, address, limit=1, **params)
+        result = results[0] if results else None
+
+        if cache is not None and result is not None:
+            cache.set(key, result)
+
+        return result
+
+    return memory_cache.get_or_load(key, load)
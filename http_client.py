@@ -0,0 +1,122 @@
+"""
+Shared HTTP client for the Yandex Maps and Overpass scripts.
+
+Every request goes through a single requests.Session, so connections are
+kept alive and reused instead of paying a new DNS lookup, TCP connect and
+TLS handshake on each call, and through the request scheduler, which keeps
+each API key within its quota and retries throttled requests.
+"""
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scheduler import default_scheduler
+
+# Number of keep-alive connections kept per host
+DEFAULT_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+# Number of hosts a pool is kept for
+DEFAULT_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "8"))
+# Seconds to wait for the server before giving up
+DEFAULT_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+# Base URL that replaces the scheme and host of every request, keeping the
+# original host as the first path segment, for example
+# http://127.0.0.1:8765/geocode-maps.yandex.ru/1.x/; used by the benchmarks
+HOST_OVERRIDE = os.getenv("HTTP_HOST_OVERRIDE", "")
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _accept_encoding():
+    """Build the Accept-Encoding header from the decoders urllib3 can use"""
+    encodings = ["gzip", "deflate"]
+    try:
+        import brotli  # noqa: F401
+        encodings.append("br")
+    except ImportError:
+        pass
+    return ", ".join(encodings)
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, pool_hosts=DEFAULT_POOL_HOSTS):
+    """
+    Create a session with keep-alive connection pools
+
+    Args:
+        pool_size (int): Maximum number of connections kept per host
+        pool_hosts (int): Number of per-host pools to keep
+
+    Returns:
+        requests.Session: Configured session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = _accept_encoding()
+    return session
+
+
+def get_session():
+    """Return the shared session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def configure(pool_size=DEFAULT_POOL_SIZE, pool_hosts=DEFAULT_POOL_HOSTS):
+    """Replace the shared session with one using the given pool sizes"""
+    global _session
+    with _session_lock:
+        old_session, _session = _session, create_session(pool_size, pool_hosts)
+    if old_session is not None:
+        old_session.close()
+
+
+def close():
+    """Close the shared session and all of its pooled connections"""
+    global _session
+    with _session_lock:
+        old_session, _session = _session, None
+    if old_session is not None:
+        old_session.close()
+
+
+def resolve_url(url):
+    """The URL a request is actually sent to, see HOST_OVERRIDE"""
+    if not HOST_OVERRIDE:
+        return url
+    parts = urlsplit(url)
+    query = f"?{parts.query}" if parts.query else ""
+    return f"{HOST_OVERRIDE.rstrip('/')}/{parts.netloc}{parts.path}{query}"
+
+
+def request(method, url, priority=None, **kwargs):
+    """
+    Send a request through the scheduler and the shared session
+
+    Args:
+        method (str): HTTP method
+        url (str): Request URL
+        priority (int): scheduler.INTERACTIVE, scheduler.BULK or any other
+            level, lower goes first (default: the scheduler.priority() context)
+        **kwargs: Passed to requests.Session.request
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return default_scheduler.send(get_session().request, method, resolve_url(url), priority, **kwargs)
+
+
+def get(url, **kwargs):
+    """Send a GET request through the shared session"""
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    """Send a POST request through the shared session"""
+    return request("POST", url, **kwargs)
@@ -0,0 +1,165 @@
+"""
+Writing map images to disk.
+
+Static Maps already returns encoded PNG/JPEG images, so by default the raw
+bytes are written to the target file as they are, without decoding them.
+Pillow is only imported when the caller asks for a format conversion, a
+resize or an overlay.
+"""
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+# Magic bytes of the formats Static Maps can return
+SIGNATURES = {
+    "PNG": b"\x89PNG\r\n\x1a\n",
+    "JPEG": b"\xff\xd8\xff",
+    "GIF": b"GIF8",
+}
+
+# os.umask can only be read by setting it, so do that once while importing
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+EXTENSIONS = {
+    ".png": "PNG",
+    ".jpg": "JPEG",
+    ".jpeg": "JPEG",
+    ".gif": "GIF",
+    ".webp": "WEBP",
+}
+
+
+def detect_format(data):
+    """Image format from its first bytes, or None if unknown"""
+    for image_format, signature in SIGNATURES.items():
+        if bytes(data[:len(signature)]) == signature:
+            return image_format
+    return None
+
+
+def format_for_path(path):
+    """Image format implied by the file extension, or None if unknown"""
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def needs_conversion(data, path):
+    """Whether data has to be re-encoded to match the extension of path"""
+    target = format_for_path(path)
+    return target is not None and detect_format(data) not in (None, target)
+
+
+def write_atomic(path, chunks):
+    """
+    Write byte chunks to a file so readers never see it half written
+
+    Args:
+        path (str): Target file
+        chunks (iterable): Byte strings or memoryviews
+
+    Returns:
+        int: Number of bytes written
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+        # mkstemp creates the file as 0600; give it the mode open() would have
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return size
+
+
+def write_image(data, path):
+    """
+    Write image bytes to a file, converting only if the extension asks for another format
+
+    Args:
+        data (bytes): Encoded image
+        path (str): Target file
+    """
+    if needs_conversion(data, path):
+        convert_image(data, path)
+    else:
+        write_atomic(path, [data])
+
+
+def convert_image(data, path, image_format=None, size=None, overlay=None,
+                  compress_level=6, quality=85, optimize=False):
+    """
+    Decode an image with Pillow and save it re-encoded
+
+    Args:
+        data (bytes): Encoded source image
+        path (str): Target file
+        image_format (str): PNG, JPEG, WEBP, ... (default: from the extension of path)
+        size (tuple): (width, height) to resize to
+        overlay (tuple): (image path, (x, y)) pasted on top, respecting its transparency
+        compress_level (int): zlib level 0-9 for PNG
+        quality (int): Quality 1-95 for JPEG and WEBP
+        optimize (bool): Let the encoder spend extra time on a smaller file
+
+    Returns:
+        str: path
+    """
+    from io import BytesIO
+
+    from PIL import Image
+
+    image_format = image_format or format_for_path(path) or "PNG"
+    image = Image.open(BytesIO(data))
+
+    if size is not None:
+        image = image.resize(size, Image.LANCZOS)
+
+    if overlay is not None:
+        overlay_path, position = overlay
+        image = image.convert("RGBA")
+        with Image.open(overlay_path) as layer:
+            layer = layer.convert("RGBA")
+            image.paste(layer, position, layer)
+
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    options = {"optimize": optimize}
+    if image_format == "PNG":
+        options["compress_level"] = compress_level
+    elif image_format in ("JPEG", "WEBP"):
+        options["quality"] = quality
+
+    with open(path, "wb") as f:
+        image.save(f, format=image_format, **options)
+    return path
+
+
+def _convert_job(job):
+    data, path, options = job
+    return convert_image(data, path, **options)
+
+
+def convert_many(jobs, max_workers=None):
+    """
+    Convert many images in a process pool
+
+    Args:
+        jobs (iterable): Tuples (data, path, options) where options are
+            keyword arguments of convert_image
+        max_workers (int): Number of processes (default: number of CPUs)
+
+    Returns:
+        list: Written paths in input order
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_convert_job, jobs))
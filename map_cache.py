@@ -0,0 +1,195 @@
+"""
+Content-addressed disk cache for Static Maps images.
+
+A Static Maps image depends only on its request parameters, so the raw
+image bytes are stored under a hash of the canonicalized parameters (the
+API key excluded). Files are written atomically, which makes the cache
+safe to share between processes, and the least recently used files are
+removed once the total size goes over the limit. An optional in-memory
+tier keeps the most recent images in front of the disk.
+"""
+import hashlib
+import os
+import threading
+from urllib.parse import urlencode
+
+from image_output import write_atomic
+from memory_cache import MemoryCache
+from metrics import record_cache
+
+DEFAULT_DIR = os.getenv(
+    "STATIC_MAP_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "yandex-map-api", "static-maps"),
+)
+DEFAULT_MAX_BYTES = int(os.getenv("STATIC_MAP_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Number of images kept in memory, 0 disables the in-memory tier
+DEFAULT_MEMORY_ENTRIES = int(os.getenv("STATIC_MAP_MEMORY_CACHE_SIZE", "64"))
+
+IGNORED_PARAMS = {"apikey"}
+
+
+def make_key(url, params):
+    """
+    Hash a Static Maps request into a cache key
+
+    Args:
+        url (str): Endpoint URL
+        params (dict): Request parameters (apikey is ignored)
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    canonical = sorted((k, str(v)) for k, v in params.items() if k not in IGNORED_PARAMS)
+    return hashlib.sha256(f"{url}?{urlencode(canonical)}".encode("utf-8")).hexdigest()
+
+
+class MapCache:
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 memory_entries=DEFAULT_MEMORY_ENTRIES):
+        """
+        Args:
+            directory (str): Where image files are stored
+            max_bytes (int): Total size of the stored files before eviction starts
+            memory_entries (int): Images kept in memory, 0 disables the in-memory tier
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory = MemoryCache(max_entries=memory_entries, name="static_map_memory") if memory_entries else None
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """
+        Look up cached image bytes
+
+        Returns:
+            bytes: Image data or None if not cached
+        """
+        if self.memory is not None:
+            found, data = self.memory.get(key)
+            if found:
+                self._count(hit=True)
+                return data
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # The modification time doubles as the last access time for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            self._count(hit=False)
+            return None
+
+        if self.memory is not None:
+            self.memory.set(key, data)
+        self._count(hit=True)
+        return data
+
+    def _count(self, hit):
+        record_cache("static_map", hit)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, key, data):
+        """Store image bytes, evicting old files if the size limit is exceeded"""
+        if self.memory is not None:
+            self.memory.set(key, data)
+
+        self._store(key, [data])
+
+    def put_file(self, key, source_path, chunk_size=64 * 1024):
+        """Store an image that was already written to a file, without loading it whole"""
+        with open(source_path, "rb") as f:
+            self._store(key, iter(lambda: f.read(chunk_size), b""))
+
+    def _store(self, key, chunks):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Other processes never see a partially written image
+        size = write_atomic(path, chunks)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += size
+            over_limit = self._total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def _files(self):
+        """(mtime, size, path) of every stored image"""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._files())
+
+    def evict(self):
+        """Remove the least recently used images until the cache fits max_bytes"""
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self._total_bytes = total
+
+    def stats(self):
+        """
+        Get cache statistics
+
+        Returns:
+            dict: hits, misses and hit_ratio
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """
+    Return the shared cache, or None if STATIC_MAP_CACHE_DIR is set to an empty string
+    """
+    global _default_cache
+    if not DEFAULT_DIR:
+        return None
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = MapCache()
+    return _default_cache
@@ -0,0 +1,132 @@
+"""
+In-process LRU cache with negative caching and request coalescing.
+
+Sits in front of the geocoder and search functions. Empty results
+("not found") are cached too, but for a shorter time, and concurrent
+lookups of the same key share a single in-flight request.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from metrics import record_cache
+
+
+class MemoryCache:
+    def __init__(self, max_entries=10000, ttl=3600, negative_ttl=300, name="memory"):
+        """
+        Args:
+            max_entries (int): Maximum number of cached results
+            ttl (float): Seconds a found result stays valid
+            negative_ttl (float): Seconds an empty result (None, [], {}) stays valid
+            name (str): Cache label in the metrics
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Look up a cached result
+
+        Returns:
+            tuple: (found, value)
+        """
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                record_cache(self.name, hit=True)
+                return True, value
+            del self._entries[key]
+        self.misses += 1
+        record_cache(self.name, hit=False)
+        return False, None
+
+    def set(self, key, value):
+        """Cache a result, using the negative TTL for empty results"""
+        ttl = self.ttl if value else self.negative_ttl
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key, load):
+        """
+        Return the cached result or compute it with ``load()``
+
+        If another thread is already loading the same key, wait for its
+        result instead of starting a second request. Exceptions raised by
+        ``load`` are passed to every waiting caller and are not cached.
+
+        Args:
+            key: Cache key
+            load (callable): Function without arguments producing the result
+
+        Returns:
+            Cached or freshly loaded result
+        """
+        with self._lock:
+            found, value = self._get(key)
+            if found:
+                return value
+
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = load()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def clear(self):
+        """Remove all cached results"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Get cache statistics
+
+        Returns:
+            dict: hits, misses, coalesced, hit_ratio and number of stored entries
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,118 @@
+"""
+Mercator projection as used by Yandex Maps.
+
+Yandex tiles use the elliptical Mercator projection on the WGS 84
+ellipsoid (EPSG:3395), not the spherical "Web Mercator" of most other map
+services. Pixel coordinates are global: at zoom z the whole world is
+256 * 2**z pixels wide, with (0, 0) in the north-west corner.
+"""
+import numpy as np
+
+from geo import as_points
+
+TILE_SIZE = 256
+WGS84_E = 0.0818191908426  # First eccentricity of the WGS 84 ellipsoid
+
+# Zoom levels accepted by Static Maps
+MIN_ZOOM = 0
+MAX_ZOOM = 17
+# Space kept free around the fitted points, enough for a marker
+DEFAULT_PADDING = 32
+# Iterations of the inverse projection, enough for double precision
+INVERSE_ITERATIONS = 8
+
+
+def world_size(zoom):
+    """Width of the world in pixels at the given zoom"""
+    return TILE_SIZE * 2.0 ** zoom
+
+
+def lonlat_to_pixels(points, zoom):
+    """
+    Project (longitude, latitude) points to global pixel coordinates
+
+    Args:
+        points (array-like): (longitude, latitude) pairs, shape (n, 2)
+        zoom (float): Zoom level
+
+    Returns:
+        numpy.ndarray: (x, y) pixel pairs, shape (n, 2)
+    """
+    points = as_points(points)
+    size = world_size(zoom)
+
+    lat = np.radians(np.clip(points[:, 1], -85.0840591556, 85.0840591556))
+    e_sin = WGS84_E * np.sin(lat)
+    y = np.log(np.tan(np.pi / 4 + lat / 2) * ((1 - e_sin) / (1 + e_sin)) ** (WGS84_E / 2))
+
+    pixels = np.empty_like(points)
+    pixels[:, 0] = (points[:, 0] + 180.0) / 360.0 * size
+    pixels[:, 1] = (0.5 - y / (2 * np.pi)) * size
+    return pixels
+
+
+def degrees_per_pixel(zoom):
+    """Longitude degrees covered by one pixel at the given zoom"""
+    return 360.0 / world_size(zoom)
+
+
+def pixels_to_lonlat(pixels, zoom):
+    """
+    Convert global pixel coordinates back to (longitude, latitude)
+
+    Args:
+        pixels (array-like): (x, y) pixel pairs, shape (n, 2)
+        zoom (float): Zoom level
+
+    Returns:
+        numpy.ndarray: (longitude, latitude) pairs, shape (n, 2)
+    """
+    pixels = as_points(pixels)
+    size = world_size(zoom)
+
+    t = np.exp((pixels[:, 1] / size - 0.5) * 2 * np.pi)
+    # The latitude appears on both sides of the equation, iterate to a fixed point
+    lat = np.pi / 2 - 2 * np.arctan(t)
+    for _ in range(INVERSE_ITERATIONS):
+        e_sin = WGS84_E * np.sin(lat)
+        lat = np.pi / 2 - 2 * np.arctan(t * ((1 - e_sin) / (1 + e_sin)) ** (WGS84_E / 2))
+
+    points = np.empty_like(pixels)
+    points[:, 0] = pixels[:, 0] / size * 360.0 - 180.0
+    points[:, 1] = np.degrees(lat)
+    return points
+
+
+def fit_viewport(points, size=(650, 450), padding=DEFAULT_PADDING,
+                 min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """
+    Centre and zoom that show all points in an image of the given size
+
+    Args:
+        points (array-like): (longitude, latitude) pairs of markers and polyline vertices
+        size (tuple): (width, height) of the image in pixels
+        padding (int): Pixels kept free on every side
+        min_zoom (int): Lowest zoom to return
+        max_zoom (int): Highest zoom to return, also used for a single point
+
+    Returns:
+        tuple: ((longitude, latitude) of the centre, integer zoom)
+    """
+    pixels = lonlat_to_pixels(points, 0)
+    low = pixels.min(axis=0)
+    high = pixels.max(axis=0)
+    extent = high - low
+
+    available = np.maximum(np.asarray(size, dtype=np.float64) - 2 * padding, 1.0)
+    with np.errstate(divide="ignore"):
+        scale = np.min(available / extent)
+    zoom = max_zoom if not np.isfinite(scale) else int(np.floor(np.log2(scale)))
+    zoom = int(np.clip(zoom, min_zoom, max_zoom))
+
+    center = pixels_to_lonlat((low + high) / 2, 0)[0]
+    return (float(center[0]), float(center[1])), zoom
+
+
+def format_ll(center):
+    """Value of the Static Maps "ll" parameter"""
+    return f"{center[0]:.6f},{center[1]:.6f}"
@@ -0,0 +1,254 @@
+"""
+Request metrics and trace spans.
+
+Every request sent through http_client, every cache lookup and the main
+steps of the scripts are recorded here:
+
+- http_request_duration_seconds: latency histogram per endpoint, key and status
+- http_requests_total, http_response_bytes_total, http_retries_total
+- cache_requests_total (hit or miss per cache) and cache_hit_ratio
+- step_duration_seconds: latency histogram of the spans below
+
+API keys never appear in labels, only the first characters of their hash.
+
+Spans (``with span("find_district"):``) nest through contextvars, so the
+requests and steps made inside one carry its trace id. Finished spans and
+requests are passed to the hooks added with add_hook, and all metrics can
+be exported with render_prometheus(). Context variables don't follow work
+handed to thread pools, so requests made there start their own traces.
+"""
+import bisect
+import contextlib
+import contextvars
+import hashlib
+import itertools
+import os
+import threading
+import time
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    "http_request_duration_seconds": ("histogram", "Time from sending a request to its final response, retries included"),
+    "http_requests_total": ("counter", "Requests by final status"),
+    "http_response_bytes_total": ("counter", "Bytes received in response bodies"),
+    "http_retries_total": ("counter", "Requests sent again after a 429, 5xx or connection error"),
+    "cache_requests_total": ("counter", "Cache lookups by result"),
+    "cache_hit_ratio": ("gauge", "Share of cache lookups that were hits"),
+    "step_duration_seconds": ("histogram", "Duration of traced steps"),
+}
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_ids = itertools.count(1)
+_process_id = f"{os.getpid():x}"
+
+
+def key_label(api_key):
+    """Label value identifying an API key without revealing it"""
+    if not api_key:
+        return ""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        """Add to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Record a value in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def add_hook(self, hook):
+        """Call hook(event) with a dict for every finished request and span"""
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        with self._lock:
+            self._hooks.remove(hook)
+
+    def emit(self, event):
+        for hook in list(self._hooks):
+            hook(event)
+
+    def reset(self):
+        """Forget all recorded values (hooks stay)"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def counter(self, name, **labels):
+        """Current value of a counter"""
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def cache_hit_ratios(self):
+        """Hit ratio of every cache that has been used"""
+        totals = {}
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                if name == "cache_requests_total":
+                    labels = dict(labels)
+                    hits, total = totals.get(labels["cache"], (0, 0))
+                    totals[labels["cache"]] = (hits + (value if labels["result"] == "hit" else 0), total + value)
+        return {cache: hits / total for cache, (hits, total) in totals.items() if total}
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, (list(h.counts), h.sum, h.count, h.buckets)) for key, h in histograms]
+
+        samples = {}
+        for (name, labels), value in counters:
+            samples.setdefault(name, []).append(f"{name}{_labels(labels)} {value}")
+        for cache, ratio in sorted(self.cache_hit_ratios().items()):
+            samples.setdefault("cache_hit_ratio", []).append(f'cache_hit_ratio{_labels((("cache", cache),))} {ratio:.6g}')
+        for (name, labels), (counts, total, count, buckets) in histograms:
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        output = []
+        for name in sorted(samples):
+            kind, text = HELP.get(name, ("untyped", name))
+            output.append(f"# HELP {name} {text}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(samples[name])
+        return "\n".join(output) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+add_hook = registry.add_hook
+remove_hook = registry.remove_hook
+render_prometheus = registry.render_prometheus
+
+
+def current_trace():
+    """(trace_id, span_id) of the innermost open span, or (None, None)"""
+    current = _current_span.get()
+    if current is None:
+        return None, None
+    return current["trace_id"], current["span_id"]
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """
+    Trace a step; spans opened inside it become its children
+
+    Args:
+        name (str): Step name, also the "step" label of step_duration_seconds
+        **attributes: Extra fields passed to the hooks
+
+    Yields:
+        dict: The span, attributes may be added while it is open
+    """
+    parent = _current_span.get()
+    span_id = f"{_process_id}-{next(_ids)}"
+    current = {
+        "type": "span",
+        "name": name,
+        "trace_id": parent["trace_id"] if parent else span_id,
+        "span_id": span_id,
+        "parent_id": parent["span_id"] if parent else None,
+        "attributes": attributes,
+        "error": None,
+    }
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current["error"] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        current["seconds"] = time.perf_counter() - started
+        registry.observe("step_duration_seconds", current["seconds"], step=name)
+        registry.emit(current)
+
+
+def record_request(endpoint, api_key, status, seconds, size, retries):
+    """
+    Record one request as seen by the caller, after all retries
+
+    Args:
+        endpoint (str): Host and path
+        api_key (str): Key the request was sent with, or None
+        status: Final HTTP status code, or the exception name if it failed
+        seconds (float): Time from the first attempt to the final answer
+        size (int): Response body bytes, when known
+        retries (int): Attempts after the first one
+    """
+    labels = {"endpoint": endpoint, "key": key_label(api_key)}
+    registry.observe("http_request_duration_seconds", seconds, status=str(status), **labels)
+    registry.inc("http_requests_total", status=str(status), **labels)
+    if size:
+        registry.inc("http_response_bytes_total", size, **labels)
+    if retries:
+        registry.inc("http_retries_total", retries, **labels)
+
+    trace_id, span_id = current_trace()
+    registry.emit({
+        "type": "request",
+        "endpoint": endpoint,
+        "key": labels["key"],
+        "status": status,
+        "seconds": seconds,
+        "bytes": size,
+        "retries": retries,
+        "trace_id": trace_id,
+        "parent_id": span_id,
+    })
+
+
+def record_cache(cache, hit):
+    """Record a cache lookup"""
+    registry.inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
@@ -0,0 +1,235 @@
+"""
+High-resolution area images stitched from many Static Maps frames.
+
+The bounding box is projected to pixel space at the target zoom and cut
+into a grid of frames. Frames are downloaded concurrently, a couple of
+grid rows ahead of the writer, and every finished row is cropped (the
+Yandex logo and copyright sit at the bottom of each frame) and appended to
+a PNG file that is written incrementally. Memory is bounded by a few rows
+of frames, whatever the size of the area.
+
+Usage:
+    python mosaic.py --bbox 37.60,55.74,37.64,55.76 --zoom 17 --out center.png
+"""
+import argparse
+import os
+import struct
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+from dotenv import load_dotenv
+
+from mercator import lonlat_to_pixels, pixels_to_lonlat
+from scheduler import BULK, priority
+from static_maps import get_map
+
+# Largest frame Static Maps returns
+FRAME_SIZE = (650, 450)
+# Pixels cropped from the top and bottom of every frame; the bottom strip
+# holds the logo and copyright, the top one keeps the frame centre in place
+DEFAULT_MARGIN = 30
+DEFAULT_WORKERS = 8
+# Rows of frames downloaded ahead of the one being written
+ROWS_AHEAD = 2
+
+
+class PNGStreamWriter:
+    """Write an 8-bit RGB PNG row by row without holding the whole image"""
+
+    def __init__(self, path, width, height, compress_level=6):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._file = open(path, "wb")
+        self._compressor = zlib.compressobj(compress_level)
+
+        self._file.write(b"\x89PNG\r\n\x1a\n")
+        # Width, height, bit depth 8, colour type 2 (RGB), default compression, filter, no interlace
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, chunk_type, data):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+    def write_rows(self, pixels):
+        """
+        Append rows to the image
+
+        Args:
+            pixels (numpy.ndarray): uint8 array of shape (rows, width, 3)
+        """
+        rows = pixels.shape[0]
+        # Every scanline starts with its filter type, 0 means unfiltered
+        scanlines = np.zeros((rows, self.width * 3 + 1), dtype=np.uint8)
+        scanlines[:, 1:] = pixels.reshape(rows, -1)
+
+        data = self._compressor.compress(scanlines.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+        self.rows_written += rows
+
+    def close(self):
+        """Finish the image; raises ValueError if rows are missing"""
+        self._chunk(b"IDAT", self._compressor.flush())
+        self._chunk(b"IEND", b"")
+        self._file.close()
+        if self.rows_written != self.height:
+            raise ValueError(f"Wrote {self.rows_written} rows, expected {self.height}")
+
+    def abort(self):
+        """Close and delete an unfinished image"""
+        self._file.close()
+        os.remove(self.path)
+
+
+def plan_mosaic(bbox, zoom, frame_size=FRAME_SIZE, margin=DEFAULT_MARGIN):
+    """
+    Compute the grid of frames covering a bounding box
+
+    Args:
+        bbox (tuple): (min_lon, min_lat, max_lon, max_lat)
+        zoom (int): Zoom level
+        frame_size (tuple): (width, height) of one requested frame
+        margin (int): Pixels cropped from the top and bottom of every frame
+
+    Returns:
+        dict: width and height of the result in pixels, tile (usable frame
+            part) size, and centres: (rows, columns, 2) array of frame
+            centres as (longitude, latitude)
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    # North-west and south-east corners; pixel y grows to the south
+    corners = lonlat_to_pixels([(min_lon, max_lat), (max_lon, min_lat)], zoom)
+    origin = np.floor(corners[0])
+    width, height = (np.ceil(corners[1]) - origin).astype(int)
+
+    tile_width = frame_size[0]
+    tile_height = frame_size[1] - 2 * margin
+    columns = -(-width // tile_width)
+    rows = -(-height // tile_height)
+
+    xs = origin[0] + (np.arange(columns) + 0.5) * tile_width
+    ys = origin[1] + (np.arange(rows) + 0.5) * tile_height
+    grid = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+    centres = pixels_to_lonlat(grid, zoom).reshape(rows, columns, 2)
+
+    return {
+        "width": int(width),
+        "height": int(height),
+        "tile_size": (tile_width, tile_height),
+        "centres": centres,
+    }
+
+
+def _frame_params(api_key, centre, zoom, layer, frame_size):
+    return {
+        "apikey": api_key,
+        "l": layer,
+        "ll": f"{centre[0]:.8f},{centre[1]:.8f}",
+        "z": zoom,
+        "size": f"{frame_size[0]},{frame_size[1]}",
+    }
+
+
+def _get_frame(params):
+    # Survey exports must not hold up interactive requests on the same key
+    with priority(BULK):
+        return get_map(params)
+
+
+def build_mosaic(api_key, bbox, zoom, path, layer="map", frame_size=FRAME_SIZE,
+                 margin=DEFAULT_MARGIN, max_workers=DEFAULT_WORKERS):
+    """
+    Download and stitch the frames covering a bounding box into one PNG
+
+    Args:
+        api_key (str): Yandex Maps API key
+        bbox (tuple): (min_lon, min_lat, max_lon, max_lat)
+        zoom (int): Zoom level
+        path (str): Output PNG file
+        layer (str): Static Maps layer ("map" or "sat")
+        frame_size (tuple): (width, height) of one requested frame
+        margin (int): Pixels cropped from the top and bottom of every frame
+        max_workers (int): Concurrent downloads
+
+    Returns:
+        tuple: (width, height) of the written image
+
+    Raises:
+        requests.HTTPError: If a frame can't be downloaded
+    """
+    from PIL import Image
+
+    plan = plan_mosaic(bbox, zoom, frame_size, margin)
+    width, height = plan["width"], plan["height"]
+    tile_width, tile_height = plan["tile_size"]
+    centres = plan["centres"]
+    rows, columns = centres.shape[:2]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit_row(row):
+            return [executor.submit(_get_frame, _frame_params(api_key, centre, zoom, layer, frame_size))
+                    for centre in centres[row]]
+
+        pending = [submit_row(row) for row in range(min(ROWS_AHEAD, rows))]
+        writer = PNGStreamWriter(path, width, height)
+        try:
+            for row in range(rows):
+                futures = pending.pop(0)
+                if row + ROWS_AHEAD < rows:
+                    pending.append(submit_row(row + ROWS_AHEAD))
+
+                strip = np.empty((tile_height, columns * tile_width, 3), dtype=np.uint8)
+                for column, future in enumerate(futures):
+                    with Image.open(BytesIO(future.result())) as frame:
+                        frame = frame.convert("RGB")
+                        tile = np.asarray(frame)[margin:margin + tile_height]
+                    strip[:, column * tile_width:(column + 1) * tile_width] = tile
+
+                strip_height = min(tile_height, height - row * tile_height)
+                writer.write_rows(strip[:strip_height, :width])
+        except BaseException:
+            for futures in pending:
+                for future in futures:
+                    future.cancel()
+            writer.abort()
+            raise
+
+    writer.close()
+
+    return width, height
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Stitch Static Maps frames into a large image")
+    parser.add_argument("--bbox", required=True, help="min_lon,min_lat,max_lon,max_lat")
+    parser.add_argument("--zoom", type=int, default=16, help="Zoom level (1-17)")
+    parser.add_argument("--out", default="mosaic.png", help="Output PNG file")
+    parser.add_argument("--layer", default="map", help="Static Maps layer (map or sat)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent downloads")
+    args = parser.parse_args()
+
+    api_key = os.getenv('API_KEY')
+    if not api_key:
+        print("Error: API_KEY not found in environment variables")
+        sys.exit(1)
+
+    bbox = tuple(map(float, args.bbox.split(",")))
+    if len(bbox) != 4:
+        print("Error: --bbox must be min_lon,min_lat,max_lon,max_lat")
+        sys.exit(1)
+
+    width, height = build_mosaic(api_key, bbox, args.zoom, args.out, args.layer, max_workers=args.workers)
+    print(f"Mosaic {width}x{height} saved as {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Streaming helpers for Overpass API responses.
+
+Overpass replies are one JSON object whose "elements" array can hold
+tens of megabytes. iter_elements decodes that array one element at a time
+straight from the response stream, so only the element being parsed and
+the current chunk are held in memory.
+"""
+import codecs
+import heapq
+import json
+
+import numpy as np
+
+from geo import distances_to
+
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+# Elements whose distances are computed together
+DISTANCE_BATCH_SIZE = 4096
+
+_WHITESPACE = " \t\n\r"
+
+
+def iter_elements(chunks):
+    """
+    Yield the entries of the "elements" array of an Overpass JSON reply
+
+    Args:
+        chunks (iterable): Byte chunks of the response body, for example
+            ``response.iter_content(DEFAULT_CHUNK_SIZE)``
+
+    Yields:
+        dict: One element at a time
+
+    Raises:
+        ValueError: If the body is not a valid Overpass JSON reply
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer = ""
+    pos = 0
+    exhausted = False
+
+    def read_more():
+        nonlocal buffer, pos, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buffer = buffer[pos:] + text_decoder.decode(b"", final=True)
+        else:
+            buffer = buffer[pos:] + text_decoder.decode(chunk)
+        pos = 0
+
+    # Skip everything up to the opening bracket of the elements array
+    while True:
+        start = buffer.find('"elements"', pos)
+        if start != -1:
+            bracket = buffer.find("[", start)
+            if bracket != -1:
+                pos = bracket + 1
+                break
+            pos = start
+        else:
+            # Keep a tail in case the key is split between two chunks
+            pos = max(pos, len(buffer) - len('"elements"'))
+        if exhausted:
+            raise ValueError("No elements array in Overpass response")
+        read_more()
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE + ",":
+            pos += 1
+
+        if pos == len(buffer):
+            if exhausted:
+                raise ValueError("Overpass response ended inside the elements array")
+            read_more()
+            continue
+
+        if buffer[pos] == "]":
+            return
+
+        try:
+            element, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # The element is not complete yet
+            if exhausted:
+                raise ValueError("Malformed element in Overpass response")
+            read_more()
+            continue
+
+        pos = end
+        yield element
+
+
+def nearest_elements(elements, coords, k=1, element_type="node"):
+    """
+    Keep the k elements closest to a point from a stream of elements
+
+    Args:
+        elements (iterable): Overpass elements, e.g. from iter_elements
+        coords (tuple): (longitude, latitude) of the reference point
+        k (int): Number of elements to keep
+        element_type (str): Only elements of this type are considered
+
+    Returns:
+        list: Tuples (distance in meters, element), nearest first
+    """
+    best = []  # max-heap by distance through negated keys
+    counter = 0
+    batch = []
+
+    def flush():
+        nonlocal counter
+        points = [(element["lon"], element["lat"]) for element in batch]
+        distances = distances_to(coords, points)
+        # Only the k smallest of the batch can enter the result
+        for i in np.argsort(distances)[:k]:
+            counter += 1
+            item = (-float(distances[i]), counter, batch[i])
+            if len(best) < k:
+                heapq.heappush(best, item)
+            elif item[0] > best[0][0]:
+                heapq.heapreplace(best, item)
+            else:
+                break
+        batch.clear()
+
+    for element in elements:
+        if element.get("type") == element_type and "lon" in element:
+            batch.append(element)
+            if len(batch) >= DISTANCE_BATCH_SIZE:
+                flush()
+    if batch:
+        flush()
+
+    return [(-distance, element) for distance, _, element in sorted(best, reverse=True)]
@@ -0,0 +1,253 @@
+"""
+Offline index of points of interest (pharmacies by default).
+
+The index is built once from Overpass and stored as a single binary file:
+points are sorted into a regular longitude/latitude grid, and the file is
+memory-mapped when opened, so any number of worker processes share the same
+pages without copying them. Queries need no network at all.
+
+Usage:
+    python poi_index.py build --bbox 37.3,55.5,37.9,56.0 --out pharmacies.poi
+    python poi_index.py query pharmacies.poi 37.6173 55.7558 -k 3
+"""
+import argparse
+import struct
+import sys
+
+import numpy as np
+
+import http_client
+from geo import DEGREE_TO_METERS_FACTOR, distances_to
+from overpass import DEFAULT_CHUNK_SIZE, OVERPASS_URL, iter_elements
+
+MAGIC = b"POIIDX01"
+# magic, point count, grid origin (lon, lat), cell size, columns, rows, names size
+HEADER = struct.Struct("<8sqdddqqq")
+DEFAULT_CELL_SIZE = 0.01  # degrees, about 1 km
+
+
+def fetch_pois(bbox, amenity="pharmacy"):
+    """
+    Download POIs with the given amenity tag inside a bounding box
+
+    Ways and relations are reduced to their centre point.
+
+    Args:
+        bbox (tuple): (min_lon, min_lat, max_lon, max_lat)
+        amenity (str): Value of the OSM amenity tag
+
+    Returns:
+        list: Tuples (osm_id, longitude, latitude, name)
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    area = f"{min_lat},{min_lon},{max_lat},{max_lon}"
+    query = f"""
+    [out:json][timeout:180];
+    (
+      node["amenity"="{amenity}"]({area});
+      way["amenity"="{amenity}"]({area});
+      relation["amenity"="{amenity}"]({area});
+    );
+    out center tags;
+    """
+
+    pois = []
+    with http_client.post(OVERPASS_URL, data={"data": query}, timeout=300, stream=True) as response:
+        response.raise_for_status()
+
+        for element in iter_elements(response.iter_content(DEFAULT_CHUNK_SIZE)):
+            point = element if element["type"] == "node" else element.get("center")
+            if point is None:
+                continue
+            name = element.get("tags", {}).get("name", "")
+            pois.append((element["id"], point["lon"], point["lat"], name))
+    return pois
+
+
+def build_index(pois, path, cell_size=DEFAULT_CELL_SIZE):
+    """
+    Write a POI index file
+
+    Args:
+        pois (list): Tuples (osm_id, longitude, latitude, name)
+        path (str): Output file
+        cell_size (float): Grid cell size in degrees
+    """
+    ids = np.array([poi[0] for poi in pois], dtype=np.int64)
+    coords = np.array([(poi[1], poi[2]) for poi in pois], dtype=np.float64).reshape(-1, 2)
+
+    if len(coords):
+        origin = coords.min(axis=0)
+        columns, rows = (np.floor((coords.max(axis=0) - origin) / cell_size).astype(np.int64) + 1)
+    else:
+        origin = np.zeros(2)
+        columns = rows = 1
+
+    cells = _cell_ids(coords, origin, cell_size, columns)
+    order = np.argsort(cells, kind="stable")
+    cells = cells[order]
+    ids = ids[order]
+    coords = coords[order]
+
+    # cell_start[c]:cell_start[c + 1] is the range of points in cell c
+    cell_start = np.searchsorted(cells, np.arange(columns * rows + 1)).astype(np.int64)
+
+    names = [pois[i][3].encode("utf-8") for i in order]
+    name_start = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in names], out=name_start[1:])
+    names_blob = b"".join(names)
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(coords), origin[0], origin[1], cell_size,
+                            columns, rows, len(names_blob)))
+        for array in (coords, ids, cell_start, name_start):
+            f.write(array.tobytes())
+        f.write(names_blob)
+
+
+def _cell_ids(coords, origin, cell_size, columns):
+    cell = np.floor((coords - origin) / cell_size).astype(np.int64)
+    return cell[:, 1] * columns + cell[:, 0]
+
+
+class POIIndex:
+    def __init__(self, path):
+        """Open an index file built with build_index, memory-mapping its arrays"""
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+        magic, count, lon0, lat0, cell_size, columns, rows, names_size = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"Not a POI index file: {path}")
+
+        self.origin = np.array([lon0, lat0])
+        self.cell_size = cell_size
+        self.columns = columns
+        self.rows = rows
+
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        offset = HEADER.size
+        self.coords, offset = self._view(offset, np.float64, (count, 2))
+        self.ids, offset = self._view(offset, np.int64, (count,))
+        self.cell_start, offset = self._view(offset, np.int64, (columns * rows + 1,))
+        self.name_start, offset = self._view(offset, np.int64, (count + 1,))
+        self.names_blob = self._data[offset:offset + names_size]
+
+    def _view(self, offset, dtype, shape):
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        return self._data[offset:offset + size].view(dtype).reshape(shape), offset + size
+
+    def __len__(self):
+        return len(self.coords)
+
+    def name(self, i):
+        """Name of the i-th point"""
+        return bytes(self.names_blob[self.name_start[i]:self.name_start[i + 1]]).decode("utf-8")
+
+    def _candidates(self, lon, lat, radius):
+        """Indices of the points in the grid cells covering a circle"""
+        lat_span = radius / DEGREE_TO_METERS_FACTOR
+        lon_span = lat_span / max(np.cos(np.radians(min(abs(lat) + lat_span, 89.9))), 1e-6)
+
+        col0, row0 = np.floor((np.array([lon - lon_span, lat - lat_span]) - self.origin) / self.cell_size)
+        col1, row1 = np.floor((np.array([lon + lon_span, lat + lat_span]) - self.origin) / self.cell_size)
+        col0, col1 = max(int(col0), 0), min(int(col1), self.columns - 1)
+        row0, row1 = max(int(row0), 0), min(int(row1), self.rows - 1)
+        if col0 > col1 or row0 > row1:
+            return np.empty(0, dtype=np.int64)
+
+        # The cells of one grid row are stored next to each other
+        row_starts = np.arange(row0, row1 + 1) * self.columns
+        starts = self.cell_start[row_starts + col0]
+        ends = self.cell_start[row_starts + col1 + 1]
+        return np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+
+    def within(self, lon, lat, radius):
+        """
+        Points within a radius, nearest first
+
+        Args:
+            lon (float): Longitude of the centre
+            lat (float): Latitude of the centre
+            radius (float): Radius in meters
+
+        Returns:
+            list: Tuples (index, distance in meters)
+        """
+        candidates = self._candidates(lon, lat, radius)
+        distances = distances_to((lon, lat), self.coords[candidates])
+        inside = distances <= radius
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind="stable")
+        return [(int(candidates[i]), float(distances[i])) for i in order]
+
+    def nearest(self, lon, lat, k=1, max_radius=None):
+        """
+        The k nearest points
+
+        The search radius starts at one grid cell and doubles until k points
+        are found inside it, so only nearby cells are ever read.
+
+        Args:
+            lon (float): Longitude of the query point
+            lat (float): Latitude of the query point
+            k (int): Number of points to return
+            max_radius (float): Give up beyond this many meters
+
+        Returns:
+            list: Tuples (index, distance in meters), nearest first
+        """
+        k = min(k, len(self))
+        cell_meters = self.cell_size * DEGREE_TO_METERS_FACTOR
+        # Beyond this radius every point of the grid is already covered
+        full_radius = self._distance_to_grid(lon, lat) + 2 * cell_meters * max(self.columns, self.rows)
+        if max_radius is not None:
+            full_radius = min(full_radius, max_radius)
+
+        radius = min(cell_meters, full_radius)
+        while True:
+            found = self.within(lon, lat, radius)
+            if len(found) >= k or radius >= full_radius:
+                return found[:k]
+            radius = min(radius * 2, full_radius)
+
+    def _distance_to_grid(self, lon, lat):
+        far_corner = self.origin + self.cell_size * np.array([self.columns, self.rows])
+        nearest_point = np.clip([lon, lat], self.origin, far_corner)
+        return float(distances_to((lon, lat), [nearest_point])[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline POI index")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Download POIs from Overpass and build an index")
+    build.add_argument("--bbox", required=True, help="min_lon,min_lat,max_lon,max_lat")
+    build.add_argument("--out", required=True, help="Index file to write")
+    build.add_argument("--amenity", default="pharmacy", help="OSM amenity tag value")
+    build.add_argument("--cell-size", type=float, default=DEFAULT_CELL_SIZE, help="Grid cell size in degrees")
+
+    query = commands.add_parser("query", help="Find the nearest POIs in an index")
+    query.add_argument("index", help="Index file")
+    query.add_argument("lon", type=float)
+    query.add_argument("lat", type=float)
+    query.add_argument("-k", type=int, default=1, help="Number of POIs to return")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        bbox = tuple(map(float, args.bbox.split(",")))
+        if len(bbox) != 4:
+            print("Error: --bbox must be min_lon,min_lat,max_lon,max_lat")
+            sys.exit(1)
+        pois = fetch_pois(bbox, args.amenity)
+        build_index(pois, args.out, args.cell_size)
+        print(f"Indexed {len(pois)} POIs into {args.out}")
+    else:
+        index = POIIndex(args.index)
+        for i, distance in index.nearest(args.lon, args.lat, args.k):
+            lon, lat = index.coords[i]
+            print(f"{index.name(i) or '-'}\t{lon:.6f},{lat:.6f}\t{distance:.0f} m")
+
+
+if __name__ == "__main__":
+    main()
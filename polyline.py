@@ -0,0 +1,145 @@
+"""
+Preparing long polylines for the Static Maps "pl" parameter.
+
+A GPS track of a few thousand points formatted with six decimals does not
+fit into a Static Maps URL. The helpers here drop the points that make no
+visible difference at the target zoom (Douglas-Peucker in pixel space),
+keep only as many decimals as the zoom can show, use the compact base64
+encoding the API accepts, and, if that is still too long, split the track
+into the smallest number of requests.
+"""
+import base64
+import math
+from urllib.parse import quote
+
+import numpy as np
+
+from geo import as_points
+from mercator import degrees_per_pixel, lonlat_to_pixels
+
+# Longest Static Maps request URL the API accepts
+MAX_URL_LENGTH = 8192
+# Points that may move by less than this many pixels are dropped
+DEFAULT_TOLERANCE = 1.0
+
+
+def simplify(points, zoom, tolerance=DEFAULT_TOLERANCE):
+    """
+    Douglas-Peucker simplification with a tolerance in pixels at the given zoom
+
+    Args:
+        points (array-like): (longitude, latitude) pairs, shape (n, 2)
+        zoom (float): Zoom level the line will be drawn at
+        tolerance (float): Maximum allowed deviation in pixels
+
+    Returns:
+        numpy.ndarray: Remaining points, first and last always kept
+    """
+    points = as_points(points)
+    if len(points) < 3:
+        return points
+
+    pixels = lonlat_to_pixels(points, zoom)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        distances = _segment_distances(pixels[first + 1:last], pixels[first], pixels[last])
+        farthest = int(distances.argmax())
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return points[keep]
+
+
+def _segment_distances(points, start, end):
+    """Distances from points to the segment start-end"""
+    segment = end - start
+    length_squared = float(segment @ segment)
+    if length_squared == 0:
+        return np.hypot(*(points - start).T)
+    t = np.clip((points - start) @ segment / length_squared, 0.0, 1.0)
+    projection = start + t[:, None] * segment
+    return np.hypot(*(points - projection).T)
+
+
+def coordinate_decimals(zoom):
+    """Decimals needed to place a point within a pixel at the given zoom"""
+    return max(0, math.ceil(-math.log10(degrees_per_pixel(zoom))))
+
+
+def format_polyline(points, decimals=6):
+    """Plain "lon,lat,lon,lat,..." form of a polyline"""
+    return ",".join(f"{lon:.{decimals}f},{lat:.{decimals}f}" for lon, lat in as_points(points))
+
+
+def encode_polyline(points):
+    """
+    Compact form of a polyline accepted by Static Maps
+
+    Coordinates are multiplied by 1 000 000, every point except the first is
+    stored as the offset from the previous one, the values are written as
+    little-endian signed 32-bit integers (longitude, latitude) and the bytes
+    are encoded with URL-safe base64.
+    """
+    scaled = np.round(as_points(points) * 1e6).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    return base64.urlsafe_b64encode(deltas.astype("<i4").tobytes()).decode("ascii")
+
+
+def _encoded_length(text):
+    return len(quote(text, safe=""))
+
+
+def _fits(points, decimals, budget):
+    """Shortest form of the polyline and whether it fits into budget URL characters"""
+    candidates = (encode_polyline(points), format_polyline(points, decimals))
+    text = min(candidates, key=_encoded_length)
+    return text, _encoded_length(text) <= budget
+
+
+def build_polylines(points, zoom, budget, tolerance=DEFAULT_TOLERANCE):
+    """
+    Turn a track into as few "pl" values as possible, each within budget
+
+    Args:
+        points (array-like): (longitude, latitude) pairs
+        zoom (float): Zoom level the track will be drawn at
+        budget (int): URL characters available for the "pl" value
+        tolerance (float): Simplification tolerance in pixels
+
+    Returns:
+        list: Tuples (pl value, points of that part); consecutive parts
+            share their end points so the drawn line stays continuous
+    """
+    points = simplify(points, zoom, tolerance)
+    decimals = coordinate_decimals(zoom)
+
+    text, fits = _fits(points, decimals, budget)
+    if fits:
+        return [(text, points)]
+
+    # Greedily give each request as many points as fit
+    parts = []
+    start = 0
+    while start < len(points) - 1:
+        low, high = start + 2, len(points)  # a part needs at least two points
+        while low < high:
+            middle = (low + high + 1) // 2
+            if _fits(points[start:middle], decimals, budget)[1]:
+                low = middle
+            else:
+                high = middle - 1
+        end = max(low, start + 2)
+        part = points[start:end]
+        parts.append((_fits(part, decimals, budget)[0], part))
+        start = end - 1
+    return parts
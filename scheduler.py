@@ -0,0 +1,268 @@
+"""
+Quota-aware scheduling of outgoing API requests.
+
+Every request sent through http_client passes through here:
+
+- a token bucket per (API key, endpoint) keeps each key within its rate,
+  and callers waiting for a token are served by priority, so interactive
+  calls go ahead of bulk jobs
+- 429 and 5xx answers and connection errors are retried with jittered
+  exponential backoff, honouring Retry-After
+- a circuit breaker per host stops sending requests to a host that keeps
+  failing and lets a single probe through after a cool-down
+"""
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+
+from metrics import record_request
+
+INTERACTIVE = 0
+BULK = 10
+
+DEFAULT_RATE = float(os.getenv("API_RATE_LIMIT", "20"))  # requests per second
+DEFAULT_BURST = float(os.getenv("API_RATE_BURST", "20"))
+MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "3"))
+BACKOFF_BASE = 0.5  # seconds
+BACKOFF_CAP = 60.0  # seconds
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+BREAKER_THRESHOLD = 5  # consecutive failures before a host is cut off
+BREAKER_RESET_TIMEOUT = 30.0  # seconds before a probe request is let through
+
+_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of sending a request to a host whose circuit is open"""
+
+
+@contextlib.contextmanager
+def priority(level):
+    """Send the requests made inside the block with the given priority (lower goes first)"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        """
+        Args:
+            rate (float): Tokens added per second
+            burst (float): Most tokens that can be saved up
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._waiters = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, level=INTERACTIVE):
+        """Block until a token is available and it is this caller's turn by priority"""
+        with self._condition:
+            entry = (level, next(self._counter))
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    self._refill()
+                    if self._waiters[0] == entry:
+                        if self._tokens >= 1:
+                            heapq.heappop(self._waiters)
+                            self._tokens -= 1
+                            self._condition.notify_all()
+                            return
+                        self._condition.wait((1 - self._tokens) / self.rate)
+                    else:
+                        self._condition.wait()
+            except BaseException:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._condition.notify_all()
+                raise
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self, host):
+        """Raise CircuitOpenError unless a request to the host may be sent now"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._probing:
+                # Half-open: let one request through to test the host
+                self._probing = True
+                return
+        raise CircuitOpenError(f"Circuit open for {host} after {self.failures} failures")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+def retry_after(response):
+    """Seconds to wait according to a Retry-After header, or None"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt):
+    """Full-jitter exponential backoff delay for a retry attempt (0-based)"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class Scheduler:
+    def __init__(self, max_retries=MAX_RETRIES):
+        self.max_retries = max_retries
+        self._buckets = {}
+        self._breakers = {}
+        self._rates = {}
+        self._lock = threading.Lock()
+
+    def configure_rate(self, endpoint, rate, burst=None, api_key=None):
+        """
+        Set the rate for an endpoint, for one key or (api_key=None) all keys
+
+        Args:
+            endpoint (str): Host and path, e.g. "geocode-maps.yandex.ru/1.x/"
+            rate (float): Requests per second
+            burst (float): Requests that may be sent at once (default: rate)
+        """
+        with self._lock:
+            self._rates[(api_key, endpoint)] = (rate, burst or rate)
+            for key in [key for key in self._buckets if key[1] == endpoint]:
+                if api_key is None or key[0] == api_key:
+                    del self._buckets[key]
+
+    def bucket(self, api_key, endpoint):
+        with self._lock:
+            key = (api_key, endpoint)
+            if key not in self._buckets:
+                rate, burst = self._rates.get(key) or self._rates.get((None, endpoint)) \
+                    or (DEFAULT_RATE, DEFAULT_BURST)
+                self._buckets[key] = TokenBucket(rate, burst)
+            return self._buckets[key]
+
+    def breaker(self, host):
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker()
+            return self._breakers[host]
+
+    def send(self, send, method, url, level=None, **kwargs):
+        """
+        Send a request within quota, retrying throttled and failed attempts
+
+        Args:
+            send (callable): Function (method, url, **kwargs) -> requests.Response
+            method (str): HTTP method
+            url (str): Request URL
+            level (int): Priority, lower goes first (default: the priority() context)
+            **kwargs: Passed to send
+
+        Returns:
+            requests.Response: The first successful response, or the last one
+                if retries ran out
+
+        Raises:
+            CircuitOpenError: If the host's circuit is open
+            requests.RequestException: If the last attempt failed to connect
+        """
+        level = _priority.get() if level is None else level
+        parts = urlsplit(url)
+        endpoint = parts.netloc + parts.path
+        api_key = (kwargs.get("params") or {}).get("apikey")
+        bucket = self.bucket(api_key, endpoint)
+        breaker = self.breaker(parts.netloc)
+        started = time.perf_counter()
+
+        attempt = 0
+        while True:
+            try:
+                breaker.allow(parts.netloc)
+            except CircuitOpenError as e:
+                record_request(endpoint, api_key, type(e).__name__, time.perf_counter() - started, 0, attempt)
+                raise
+
+            try:
+                bucket.acquire(level)
+                response = send(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                breaker.record_failure()
+                if attempt >= self.max_retries:
+                    record_request(endpoint, api_key, type(e).__name__, time.perf_counter() - started, 0, attempt)
+                    raise
+                time.sleep(backoff(attempt))
+                attempt += 1
+                continue
+            except BaseException as e:
+                # Anything else is not retried, but it still counts against the
+                # host and must not leave a half-open probe pending forever
+                breaker.record_failure()
+                record_request(endpoint, api_key, type(e).__name__, time.perf_counter() - started, 0, attempt)
+                raise
+
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                # A streamed body hasn't been read yet, its size is only known from the header
+                size = int(response.headers.get("Content-Length", 0)) if kwargs.get("stream") \
+                    else len(response.content)
+                record_request(endpoint, api_key, response.status_code,
+                               time.perf_counter() - started, size, attempt)
+                return response
+
+            delay = retry_after(response)
+            delay = backoff(attempt) if delay is None else min(delay, BACKOFF_CAP)
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+
+default_scheduler = Scheduler()
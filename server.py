@@ -0,0 +1,416 @@
+"""
+JSON HTTP service exposing the scripts' functions in one long-lived process.
+
+The shared HTTP session, the geocode, search and static map caches and
+DistrictFinder's district envelopes stay warm across requests. Connections
+are served by asyncio and the blocking calls run in a thread pool, so
+thousands of mostly idle clients cost little; HTTP/1.1 keep-alive is
+supported. SIGINT or SIGTERM stops accepting connections, lets requests
+in progress finish (up to --grace seconds) and closes the HTTP pool.
+
+Errors of the Yandex and Overpass APIs are answered with 502, failed or
+refused connections to them (including an open circuit) with 503.
+
+Endpoints (GET with query parameters, or POST with a JSON object):
+
+    /geocode?address=...                     position, precision and text of an address
+    /district?address=...                   district of an address
+    /pharmacy?address=...|lon=&lat=[&source=osm]   nearest pharmacy
+        (with PHARMACY_INDEX set, source=osm uses that POI index instead of Overpass)
+    /distance?from=lon,lat&to=lon,lat[&method=...] distance in meters
+        (from_address / to_address instead of coordinates also work)
+    /map?points=lon,lat;...|path=lon,lat;...|ll=&z=[&pt=][&l=&size=]   Static Maps image
+    /metrics                                 Prometheus metrics
+    /health
+
+Usage:
+    python server.py --port 8080 --workers 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from dotenv import load_dotenv
+
+import cli
+import http_client
+import metrics
+from clustering import cluster_markers
+from geo import METHODS, lonlat_distance
+from geocoder import geocode
+from image_output import detect_format
+from mercator import fit_viewport, format_ll
+from poi_index import POIIndex
+from polyline import MAX_URL_LENGTH, build_polylines
+from static_maps import get_map, request_url
+
+DEFAULT_WORKERS = 64
+MAX_BODY = 1024 * 1024
+# Longest request or header line; /map?path= with tens of thousands of points fits
+MAX_LINE = 1024 * 1024
+MAX_HEADERS = 100
+IDLE_TIMEOUT = 60.0  # seconds a keep-alive connection may wait for its next request
+DEFAULT_GRACE = 10.0  # seconds given to requests in progress at shutdown
+CONTENT_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "GIF": "image/gif"}
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 414: "URI Too Long", 422: "Unprocessable Entity",
+           431: "Request Header Fields Too Large", 500: "Internal Server Error",
+           502: "Bad Gateway", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    """An error answered to the client with the given status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _points(value):
+    """Parse "lon,lat;lon,lat;..." into a list of (lon, lat)"""
+    try:
+        points = [tuple(map(float, point.split(","))) for point in str(value).split(";") if point]
+    except ValueError:
+        points = None
+    if points is None or any(len(point) != 2 for point in points):
+        raise HTTPError(400, f"Bad coordinates: {value}")
+    return points
+
+
+def _point(value):
+    """Parse a single "lon,lat" """
+    points = _points(value)
+    if len(points) != 1:
+        raise HTTPError(400, f"Expected one point: {value}")
+    return points[0]
+
+
+def _require(params, name):
+    if not params.get(name):
+        raise HTTPError(400, f"Missing parameter: {name}")
+    return params[name]
+
+
+class Service:
+    """The functions behind the endpoints; every method is blocking"""
+
+    def __init__(self):
+        self.geocode_api_key = os.getenv('GEOCODE_API_KEY')
+        self.search_api_key = os.getenv('SEARCH_API_KEY')
+        self.maps_api_key = os.getenv('API_KEY')
+        # Loaded once, so their caches live as long as the service
+        self.pharmacy_script = cli.load("pharmacy")
+        self.pharmacy_osm_script = cli.load("pharmacy", ["--osm"])
+        self.district_finder = cli.load("district").DistrictFinder()
+        # The offline POI index replaces Overpass, as in 5_1.py
+        index_path = os.getenv('PHARMACY_INDEX')
+        self.pharmacy_index = POIIndex(index_path) if index_path else None
+
+    def _geocode(self, address):
+        result = geocode(self.geocode_api_key, address)
+        if result is None:
+            raise HTTPError(404, f"Address not found: {address}")
+        return result
+
+    def _location(self, params, prefix=""):
+        """(lon, lat) from lon/lat, a "lon,lat" value or an address"""
+        if params.get(prefix + "lon") and params.get(prefix + "lat"):
+            try:
+                return float(params[prefix + "lon"]), float(params[prefix + "lat"])
+            except ValueError:
+                raise HTTPError(400, "Bad coordinates")
+        address = params.get(prefix + "address")
+        if address:
+            return tuple(map(float, self._geocode(address)["pos"].split()))
+        raise HTTPError(400, "Missing coordinates or address")
+
+    def geocode(self, params):
+        address = _require(params, "address")
+        result = self._geocode(address)
+        lon, lat = map(float, result["pos"].split())
+        return {"address": address, "lon": lon, "lat": lat, "precision": result["precision"],
+                "kind": result["kind"], "text": result["text"]}
+
+    @metrics.span("find_district")
+    def district(self, params):
+        finder = self.district_finder
+        address = _require(params, "address")
+        result = self._geocode(address)
+        coords = result["pos"].split()
+        district = finder.district_from_components(result) or finder.lookup_district(coords)
+        if district is None:
+            raise HTTPError(404, f"District not found: {address}")
+        return {"address": address, "lon": float(coords[0]), "lat": float(coords[1]), "district": district}
+
+    def pharmacy(self, params):
+        coords = self._location(params)
+        if params.get("source") == "osm" and self.pharmacy_index is not None:
+            nearest = self.pharmacy_osm_script.nearest_in_index(self.pharmacy_index, coords)
+        elif params.get("source") == "osm":
+            nearest = self.pharmacy_osm_script.query_nearest_pharmacy_osm(coords)
+        else:
+            features = self.pharmacy_script.search_pharmacies(self.search_api_key, coords)
+            nearest = self.pharmacy_script.nearest_pharmacy(features, coords)
+        if nearest is None:
+            raise HTTPError(404, "No pharmacy found nearby")
+        return {"lon": coords[0], "lat": coords[1], "pharmacy": {**nearest, "coordinates": list(nearest["coordinates"])}}
+
+    def distance(self, params):
+        method = params.get("method", "equirectangular")
+        if method not in METHODS:
+            raise HTTPError(400, f"Unknown method: {method}")
+        origin = _point(params["from"]) if params.get("from") else self._location(params, "from_")
+        destination = _point(params["to"]) if params.get("to") else self._location(params, "to_")
+        return {"from": list(origin), "to": list(destination),
+                "distance": lonlat_distance(origin, destination, method)}
+
+    def map(self, params):
+        """Image bytes and their content type"""
+        try:
+            width, height = map(int, str(params.get("size", "650,450")).split(","))
+            zoom = int(params["z"]) if params.get("z") else None
+        except ValueError:
+            raise HTTPError(400, "Bad size or zoom")
+        size = width, height
+        request = {"apikey": self.maps_api_key, "l": params.get("l", "map"), "size": f"{size[0]},{size[1]}"}
+        points = _points(params.get("points", ""))
+        path = _points(params.get("path", ""))
+
+        if points or path:
+            center, fitted_zoom = fit_viewport(points + path, size)
+            request.update(ll=format_ll(center), z=fitted_zoom if zoom is None else zoom)
+            if path:
+                budget = MAX_URL_LENGTH - len(request_url({**request, "pl": ""}))
+                parts = build_polylines(path, request["z"], budget)
+                if len(parts) > 1:
+                    raise HTTPError(422, "Path does not fit into one image, lower the zoom")
+                request["pl"] = parts[0][0]
+            if points:
+                budget = MAX_URL_LENGTH - len(request_url({**request, "pt": ""}))
+                request["pt"] = cluster_markers(points, request["z"], budget)
+        else:
+            request.update(ll=_require(params, "ll"), z=_require(params, "z"))
+        if "pt" not in request and params.get("pt"):
+            request["pt"] = params["pt"]
+
+        data = get_map(request)
+        return data, CONTENT_TYPES.get(detect_format(data), "application/octet-stream")
+
+
+class Server:
+    def __init__(self, service, workers=DEFAULT_WORKERS, grace=DEFAULT_GRACE):
+        self.service = service
+        self.grace = grace
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.routes = {
+            "/geocode": service.geocode,
+            "/district": service.district,
+            "/pharmacy": service.pharmacy,
+            "/distance": service.distance,
+        }
+        self._server = None
+        self._connections = {}  # task -> True while a request is being handled
+        self._stopping = asyncio.Event()
+
+    async def start(self, host, port):
+        self._server = await asyncio.start_server(self._serve_connection, host, port, limit=MAX_LINE, backlog=4096)
+        return self._server.sockets[0].getsockname()
+
+    async def _call(self, function, params):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, params)
+
+    async def _handle(self, method, target, body):
+        """Status, content type and body bytes for one request"""
+        parts = urlsplit(target)
+        params = dict(parse_qsl(parts.query))
+        if method == "POST" and body:
+            try:
+                params.update(json.loads(body))
+            except (ValueError, TypeError):
+                raise HTTPError(400, "Body must be a JSON object")
+        elif method not in ("GET", "POST"):
+            raise HTTPError(405, f"Method not allowed: {method}")
+
+        if parts.path == "/health":
+            return 200, "application/json", b'{"status": "ok"}'
+        if parts.path == "/metrics":
+            return 200, "text/plain; version=0.0.4", metrics.render_prometheus().encode("utf-8")
+        if parts.path == "/map":
+            data, content_type = await self._call(self.service.map, params)
+            return 200, content_type, data
+        if parts.path not in self.routes:
+            raise HTTPError(404, f"Unknown endpoint: {parts.path}")
+
+        result = await self._call(self.routes[parts.path], params)
+        return 200, "application/json", json.dumps(result, ensure_ascii=False).encode("utf-8")
+
+    async def _respond(self, method, target, body):
+        started = time.perf_counter()
+        try:
+            status, content_type, payload = await self._handle(method, target, body)
+        except HTTPError as e:
+            status, content_type, payload = e.status, "application/json", None
+            message = str(e)
+        except requests.HTTPError as e:
+            status, content_type, payload = 502, "application/json", None
+            message = f"Upstream error: {e.response.status_code}"
+        except requests.RequestException as e:
+            status, content_type, payload = 503, "application/json", None
+            # The message holds the request URL, API key included
+            message = f"Upstream unavailable: {type(e).__name__}"
+        except Exception as e:
+            status, content_type, payload = 500, "application/json", None
+            message = f"{type(e).__name__}: {e}"
+        if payload is None:
+            payload = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+
+        endpoint = urlsplit(target).path
+        metrics.observe("server_request_duration_seconds", time.perf_counter() - started,
+                        endpoint=endpoint, status=str(status))
+        return status, content_type, payload
+
+    @staticmethod
+    async def _read_line(reader, status, message):
+        """One line, or HTTPError(status) if it is longer than MAX_LINE"""
+        try:
+            return await reader.readline()
+        except ValueError:
+            # readline turns the reader's LimitOverrunError into ValueError
+            raise HTTPError(status, message)
+
+    async def _read_request(self, reader):
+        """(method, target, version, headers, body) or None when the client is gone"""
+        line = await self._read_line(reader, 414, "Request line too long")
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "Bad request line")
+
+        headers = {}
+        while True:
+            line = await self._read_line(reader, 431, "Header line too long")
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HTTPError(431, "Too many headers")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HTTPError(400, "Bad Content-Length")
+        if length > MAX_BODY:
+            raise HTTPError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, version, headers, body
+
+    async def _serve_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = False
+        try:
+            while not self._stopping.is_set():
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), IDLE_TIMEOUT)
+                except HTTPError as e:
+                    self._write(writer, e.status, "application/json",
+                                json.dumps({"error": str(e)}).encode("utf-8"), keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+
+                method, target, version, headers, body = request
+                self._connections[task] = True
+                status, content_type, payload = await self._respond(method, target, body)
+                keep_alive = (version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                              and not self._stopping.is_set())
+                self._write(writer, status, content_type, payload, keep_alive)
+                await writer.drain()
+                self._connections[task] = False
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    @staticmethod
+    def _write(writer, status, content_type, payload, keep_alive):
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + payload)
+
+    async def shutdown(self):
+        """Stop accepting, finish requests in progress, then release resources"""
+        self._stopping.set()
+        self._server.close()
+        # Idle keep-alive connections have nothing to finish
+        for task, busy in list(self._connections.items()):
+            if not busy:
+                task.cancel()
+        if self._connections:
+            done, pending = await asyncio.wait(list(self._connections), timeout=self.grace)
+            for task in pending:
+                task.cancel()
+        await self._server.wait_closed()
+        self.executor.shutdown(wait=True)
+        http_client.close()
+
+
+async def serve(host, port, workers, grace):
+    # One pooled connection per worker thread
+    http_client.configure(pool_size=workers)
+    server = Server(Service(), workers, grace)
+    address = await server.start(host, port)
+    print(f"Serving on http://{address[0]}:{address[1]}", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C still raises KeyboardInterrupt
+
+    try:
+        await stop.wait()
+    finally:
+        print("Shutting down...", flush=True)
+        await server.shutdown()
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="JSON HTTP service for the map tools")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Threads for blocking calls")
+    parser.add_argument("--grace", type=float, default=DEFAULT_GRACE,
+                        help="Seconds requests in progress get at shutdown")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.grace))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Shared access to the Yandex Static Maps API.
+
+Images are served from the static map cache when the same request was made
+before, and downloaded through the shared HTTP client otherwise. Image
+bytes are passed through as the API returned them; nothing is decoded
+unless a conversion is asked for.
+"""
+import requests
+
+import http_client
+from image_output import needs_conversion, write_atomic, write_image
+from map_cache import get_default_cache, make_key
+from metrics import span
+
+STATIC_MAPS_URL = "https://static-maps.yandex.ru/1.x/"
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def request_url(params):
+    """Full request URL for the given parameters, for debugging output"""
+    return requests.Request("GET", STATIC_MAPS_URL, params=params).prepare().url
+
+
+@span("static_map")
+def get_map(params):
+    """
+    Get a Static Maps image
+
+    Args:
+        params (dict): Static Maps request parameters
+
+    Returns:
+        bytes: Raw image data as returned by the API
+
+    Raises:
+        requests.HTTPError: If the API answers with an error status
+        requests.RequestException: If the request fails
+    """
+    cache = get_default_cache()
+    key = make_key(STATIC_MAPS_URL, params)
+
+    if cache is not None:
+        data = cache.get(key)
+        if data is not None:
+            return data
+
+    response = http_client.get(STATIC_MAPS_URL, params=params)
+    response.raise_for_status()
+    data = response.content
+
+    if cache is not None:
+        cache.put(key, data)
+
+    return data
+
+
+@span("static_map")
+def save_map(params, path):
+    """
+    Save a Static Maps image to a file without decoding it
+
+    The response body is streamed straight into the file. It is only
+    re-encoded with Pillow if the file extension asks for a different
+    format than the API returned (for example a satellite JPEG saved as .png).
+
+    Args:
+        params (dict): Static Maps request parameters
+        path (str): Target file
+
+    Raises:
+        requests.HTTPError: If the API answers with an error status
+        requests.RequestException: If the request fails
+    """
+    cache = get_default_cache()
+    key = make_key(STATIC_MAPS_URL, params)
+
+    if cache is not None:
+        data = cache.get(key)
+        if data is not None:
+            with span("image_save"):
+                write_image(data, path)
+            return
+
+    with http_client.get(STATIC_MAPS_URL, params=params, stream=True) as response:
+        if response.status_code >= 400:
+            # Read the body while the connection is open, callers print e.response.text
+            response.content
+        response.raise_for_status()
+        chunks = response.iter_content(DEFAULT_CHUNK_SIZE)
+        first_chunk = next(chunks, b"")
+
+        if needs_conversion(first_chunk, path):
+            data = first_chunk + b"".join(chunks)
+            if cache is not None:
+                cache.put(key, data)
+            with span("image_save"):
+                write_image(data, path)
+            return
+
+        # The body is streamed into the file, so this includes the download
+        with span("image_save"):
+            write_atomic(path, _prepend(first_chunk, chunks))
+
+    if cache is not None:
+        cache.put_file(key, path)
+
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
@@ -0,0 +1,275 @@
+"""
+GPS track files read as compact float64 arrays.
+
+Points are (longitude, latitude, time) rows, time in Unix seconds or NaN
+when the file has none. Three formats are understood:
+
+- GPX: <trkpt lat=".." lon=".."><time>..</time></trkpt>, parsed
+  incrementally, so elements are freed as soon as they are read
+- CSV: lon,lat[,time] columns (a header row naming them is optional);
+  time is either Unix seconds or an ISO 8601 timestamp
+- binary (.trk): a small header followed by the rows as little-endian
+  float64, memory-mapped when opened
+
+Every reader yields chunks of at most ``chunk_size`` points, and the
+statistics carry the last point over from one chunk to the next, so files
+larger than RAM are processed in constant memory. Converting a GPX or CSV
+track to the binary format once makes later passes essentially free.
+
+Usage:
+    python tracks.py stats day.gpx
+    python tracks.py convert day.gpx day.trk
+"""
+import argparse
+import csv
+import struct
+import xml.etree.ElementTree as ElementTree
+from datetime import datetime, timezone
+from itertools import islice
+
+import numpy as np
+
+from geo import paired_distances
+
+MAGIC = b"GPSTRK01"
+# magic, point count
+HEADER = struct.Struct("<8sq")
+COLUMNS = 3  # longitude, latitude, time
+DEFAULT_CHUNK_SIZE = 1 << 20  # points, 24 MB per chunk
+
+
+def parse_time(value):
+    """Unix seconds from a number or an ISO 8601 timestamp, NaN if empty"""
+    if not value:
+        return np.nan
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    moment = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def _batched(rows, chunk_size):
+    """Turn an iterator of (lon, lat, time) tuples into (n, 3) arrays"""
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            return
+        yield np.array(batch, dtype=np.float64).reshape(-1, COLUMNS)
+
+
+def _gpx_rows(path):
+    parents = []
+    for event, element in ElementTree.iterparse(path, events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            continue
+        parents.pop()
+        # Namespaces differ between GPX versions, compare local names only
+        if element.tag.rpartition("}")[2] != "trkpt":
+            continue
+        time = next((child.text for child in element if child.tag.rpartition("}")[2] == "time"), None)
+        yield float(element.get("lon")), float(element.get("lat")), parse_time(time)
+        # Detach the finished point so a long segment doesn't pile them up
+        del parents[-1][-1]
+
+
+def _csv_rows(path):
+    with open(path, encoding="utf-8", newline="") as file:
+        rows = csv.reader(file)
+        first = next(rows, None)
+        if first is None:
+            return
+        header = [name.strip().lower() for name in first]
+        if "lon" in header and "lat" in header:
+            lon, lat = header.index("lon"), header.index("lat")
+            time = header.index("time") if "time" in header else None
+        else:
+            lon, lat, time = 0, 1, 2 if len(first) > 2 else None
+            rows = _prepend(first, rows)
+        for row in rows:
+            if row:
+                yield float(row[lon]), float(row[lat]), parse_time(row[time] if time is not None else None)
+
+
+def _prepend(first, rows):
+    yield first
+    yield from rows
+
+
+def open_binary(path):
+    """
+    Memory-map a binary track file
+
+    Returns:
+        numpy.memmap: (n, 3) float64 array of (longitude, latitude, time)
+    """
+    with open(path, "rb") as f:
+        magic, count = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"Not a binary track file: {path}")
+    return np.memmap(path, dtype="<f8", mode="r", offset=HEADER.size, shape=(count, COLUMNS))
+
+
+def iter_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Read a track file chunk by chunk
+
+    Args:
+        path (str): .gpx, .csv or .trk file
+        chunk_size (int): Most points per chunk
+
+    Yields:
+        numpy.ndarray: (n, 3) float64 arrays of (longitude, latitude, time);
+            for binary files these are views of the memory map
+    """
+    lowered = path.lower()
+    if lowered.endswith(".trk"):
+        points = open_binary(path)
+        for start in range(0, len(points), chunk_size):
+            yield points[start:start + chunk_size]
+    elif lowered.endswith(".gpx"):
+        yield from _batched(_gpx_rows(path), chunk_size)
+    else:
+        yield from _batched(_csv_rows(path), chunk_size)
+
+
+def load_track(path):
+    """Whole track as one (n, 3) array; binary files are memory-mapped, not read"""
+    if path.lower().endswith(".trk"):
+        return open_binary(path)
+    chunks = list(iter_chunks(path))
+    return np.concatenate(chunks) if chunks else np.empty((0, COLUMNS))
+
+
+def write_binary(chunks, path):
+    """
+    Write chunks of (longitude, latitude[, time]) points to a binary track file
+
+    Args:
+        chunks (iterable): Arrays of shape (n, 2) or (n, 3)
+        path (str): Output .trk file
+
+    Returns:
+        int: Number of points written
+    """
+    count = 0
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 0))
+        for chunk in chunks:
+            chunk = np.asarray(chunk, dtype="<f8")
+            if chunk.shape[1] == 2:
+                chunk = np.column_stack([chunk, np.full(len(chunk), np.nan)])
+            f.write(np.ascontiguousarray(chunk).tobytes())
+            count += len(chunk)
+        # The count is only known at the end
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, count))
+    return count
+
+
+def iter_segments(chunks, method="equirectangular"):
+    """
+    Distances and durations of consecutive point pairs, chunk by chunk
+
+    Args:
+        chunks (iterable): (n, 3) arrays from iter_chunks
+        method (str): One of geo.METHODS
+
+    Yields:
+        tuple: (distances in meters, durations in seconds) arrays, together
+            covering every segment of the track exactly once
+    """
+    previous = None
+    for chunk in chunks:
+        if not len(chunk):
+            continue
+        points = chunk if previous is None else np.concatenate([previous, chunk])
+        if len(points) > 1:
+            yield (paired_distances(points[:-1, :2], points[1:, :2], method),
+                   np.diff(points[:, 2]))
+        previous = chunk[-1:]
+
+
+def track_stats(chunks, method="equirectangular"):
+    """
+    Length, segment and speed statistics of a track
+
+    Args:
+        chunks (iterable): (n, 3) arrays from iter_chunks
+        method (str): One of geo.METHODS
+
+    Returns:
+        dict: segments, length (m), longest_segment (m), duration (s),
+            average_speed and max_speed (m/s); times are only used for
+            segments where both ends have one, and speeds are None
+            without them
+    """
+    segments = 0
+    length = 0.0
+    longest = 0.0
+    duration = 0.0
+    timed_length = 0.0
+    max_speed = None
+
+    for distances, durations in iter_segments(chunks, method):
+        segments += len(distances)
+        length += float(distances.sum())
+        longest = max(longest, float(distances.max()))
+
+        timed = durations > 0
+        if timed.any():
+            duration += float(durations[timed].sum())
+            timed_length += float(distances[timed].sum())
+            speed = float((distances[timed] / durations[timed]).max())
+            max_speed = speed if max_speed is None else max(max_speed, speed)
+
+    return {
+        "segments": segments,
+        "length": length,
+        "longest_segment": longest,
+        "duration": duration,
+        "average_speed": timed_length / duration if duration else None,
+        "max_speed": max_speed,
+    }
+
+
+def track_length(path, method="equirectangular", chunk_size=DEFAULT_CHUNK_SIZE):
+    """Length of a track file in meters"""
+    return sum(float(distances.sum()) for distances, _ in iter_segments(iter_chunks(path, chunk_size), method))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPS track files")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    stats = commands.add_parser("stats", help="Print track length and speed statistics")
+    stats.add_argument("path", help=".gpx, .csv or .trk file")
+    stats.add_argument("--method", default="equirectangular", help="Distance method")
+
+    convert = commands.add_parser("convert", help="Convert a GPX or CSV track to the binary format")
+    convert.add_argument("path", help=".gpx or .csv file")
+    convert.add_argument("out", help="Output .trk file")
+
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        count = write_binary(iter_chunks(args.path), args.out)
+        print(f"Wrote {count} points to {args.out}")
+        return
+
+    result = track_stats(iter_chunks(args.path), args.method)
+    print(f"Segments: {result['segments']}")
+    print(f"Length: {result['length'] / 1000:.2f} km")
+    print(f"Longest segment: {result['longest_segment']:.1f} m")
+    if result["average_speed"] is not None:
+        print(f"Duration: {result['duration'] / 3600:.2f} h")
+        print(f"Average speed: {result['average_speed'] * 3.6:.1f} km/h")
+        print(f"Max speed: {result['max_speed'] * 3.6:.1f} km/h")
+
+
+if __name__ == "__main__":
+    main()